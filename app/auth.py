@@ -1,23 +1,118 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
+from sqlalchemy import event, inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 import jwt
 
+from app.cache import TTLCache
 from app.crud import get_user_by_email
 from app.models.users import User as UserModel
 from app.config import (JWT_ALGORITHM,
                         JWT_SECRET_KEY,
                         ACCESS_TOKEN_EXPIRE_MINUTES,
-                        REFRESH_TOKEN_EXPIRE_DAYS)
-from app.database.session import get_async_db
+                        REFRESH_TOKEN_EXPIRE_DAYS,
+                        PRINCIPAL_CACHE_SIZE,
+                        PRINCIPAL_CACHE_TTL_SECONDS,
+                        AUTH_TRUSTED_CLAIMS,
+                        REVOKED_USERS_REFRESH_SECONDS,
+                        TOKEN_CACHE_SIZE)
+from app.database.session import get_async_db, async_session_maker
 
 # Создаём контекст для хеширования с использованием bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/token")
 
+# Кеш активных пользователей по email: избавляет каждый авторизованный запрос от SELECT в users.
+# Хранит неизменяемые Principal, а не ORM-объекты, поэтому один экземпляр безопасно отдавать параллельным запросам.
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Проверенные payload токенов по SHA-256 от токена: повторный запрос с тем же токеном не проверяет подпись.
+# Запись живёт не дольше самого токена, а exp всё равно сверяется при каждом попадании.
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Авторизованный пользователь запроса: только поля, нужные для проверки доступа.
+    Собирается из строки users (get_current_user) или из claims токена в режиме AUTH_TRUSTED_CLAIMS.
+    """
+    id: int
+    email: str
+    role: str
+    is_active: bool = True
+
+
+class RevokedUsers:
+    """
+    Список ID деактивированных пользователей в памяти процесса.
+    Перечитывается из базы не чаще раза в refresh_seconds, поэтому проверка токена не стоит запроса.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._ids: frozenset[int] = frozenset()
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def add(self, user_id: int) -> None:
+        self._ids = self._ids | {user_id}
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    async def contains(self, user_id: int) -> bool:
+        if not self._is_fresh():
+            async with self._lock:
+                if not self._is_fresh():
+                    async with async_session_maker() as db:
+                        ids = await db.scalars(select(UserModel.id).where(UserModel.is_active == False))
+                        self._ids = frozenset(ids)
+                    self._loaded_at = time.monotonic()
+
+        return user_id in self._ids
+
+
+revoked_users = RevokedUsers(refresh_seconds=REVOKED_USERS_REFRESH_SECONDS)
+
+
+def invalidate_principal(email: str) -> None:
+    """
+    Удаляет пользователя из кеша, например после деактивации или смены роли.
+    """
+    principal_cache.pop(email)
+
+
+@event.listens_for(UserModel, "after_update")
+def _invalidate_updated_principal(mapper, connection, target: UserModel) -> None:
+    state = inspect(target)
+    changed = [attr for attr in ("email", "role", "is_active") if state.attrs[attr].history.has_changes()]
+    if not changed:
+        return
+
+    emails = {target.email, *state.attrs.email.history.deleted}
+    for email in emails:
+        invalidate_principal(email)
+    if not target.is_active:
+        revoked_users.add(target.id)
+    # Повторно сбрасываем после коммита: параллельный запрос мог успеть закешировать старые данные
+    state.session.info.setdefault("invalidated_principals", set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session: Session) -> None:
+    for email in session.info.pop("invalidated_principals", ()):
+        invalidate_principal(email)
+
 
 def hash_password(password: str) -> str:
     """
@@ -53,10 +148,31 @@ def create_refresh_token(data: dict):  # New
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme),
-                           db: AsyncSession = Depends(get_async_db)):
+def decode_token(token: str) -> dict:
+    """
+    Декодирует JWT с проверкой подписи, используя кеш уже проверенных токенов.
+    Ошибки те же, что у jwt.decode, включая ExpiredSignatureError.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    now = time.time()
+    if payload is None:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        exp = payload.get("exp")
+        ttl = None if exp is None else exp - now
+        if ttl is None or ttl > 0:
+            token_cache.set(key, payload, ttl=ttl)
+    # Как и PyJWT, считаем токен просроченным при exp <= now
+    elif payload.get("exp") is not None and payload["exp"] <= now:
+        token_cache.pop(key)
+        raise jwt.ExpiredSignatureError("Signature has expired")
+
+    return payload
+
+
+def _decode_access_token(token: str) -> dict:
     """
-    Проверяет JWT и возвращает пользователя из базы.
+    Проверяет подпись и срок действия access-токена и возвращает его payload.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,7 +180,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme),
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        payload = decode_token(token)
         email: str = payload.get("sub")
         token_type = payload.get("type")
         if not email or token_type != "access":
@@ -77,14 +193,57 @@ async def get_current_user(token: str = Depends(oauth2_scheme),
         )
     except jwt.PyJWTError:
         raise credentials_exception
-    db_user = await get_user_by_email(db_session=db, email=email, is_active=True)
-    if db_user is None:
-        raise credentials_exception
 
-    return db_user
+    return payload
 
 
-async def get_current_seller(current_user: UserModel = Depends(get_current_user)):
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """
+    Проверяет JWT и возвращает активного пользователя из базы, закешированного в principal_cache.
+    Изменения через ORM в этом процессе сбрасывают кеш сразу; bulk update(User) и изменения
+    из других воркеров видны не позже чем через PRINCIPAL_CACHE_TTL_SECONDS.
+    """
+    email = _decode_access_token(token)["sub"]
+
+    principal = principal_cache.get(email)
+    if principal is None:
+        db_user = await get_user_by_email(db_session=db, email=email, is_active=True)
+        if db_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal = Principal(id=db_user.id, email=db_user.email, role=db_user.role, is_active=db_user.is_active)
+        principal_cache.set(email, principal)
+
+    return principal
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme),
+                                db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """
+    В режиме AUTH_TRUSTED_CLAIMS возвращает Principal из claims токена, сверяясь только со списком
+    деактивированных пользователей; иначе — Principal из базы, как get_current_user.
+    """
+    if not AUTH_TRUSTED_CLAIMS:
+        return await get_current_user(token=token, db=db)
+
+    payload = _decode_access_token(token)
+    user_id = payload.get("id")
+    role = payload.get("role")
+    if not isinstance(user_id, int) or not isinstance(role, str) or await revoked_users.contains(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return Principal(id=user_id, email=payload["sub"], role=role)
+
+
+async def get_current_seller(current_user: Principal = Depends(get_current_principal)):
     """
     Проверяет, что пользователь имеет роль 'seller'.
     """
@@ -93,7 +252,7 @@ async def get_current_seller(current_user: UserModel = Depends(get_current_user)
 
     return current_user
 
-async def get_current_buyer(current_user: UserModel = Depends(get_current_user)):
+async def get_current_buyer(current_user: Principal = Depends(get_current_principal)):
     """
     Проверяет, что пользователь имеет роль 'buyer'.
     """
@@ -102,11 +261,11 @@ async def get_current_buyer(current_user: UserModel = Depends(get_current_user))
 
     return current_user
 
-async def get_current_admin(current_user: UserModel = Depends(get_current_user)):
+async def get_current_admin(current_user: Principal = Depends(get_current_principal)):
     """
     Проверяет, что пользователь имеет роль 'admin'.
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can perform this action")
 
-    return current_user
\ No newline at end of file
+    return current_user
@@ -9,5 +9,60 @@ JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))
 
+# AUTH
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+# Ролевые зависимости доверяют claims токена и не загружают пользователя из базы
+AUTH_TRUSTED_CLAIMS = os.getenv("AUTH_TRUSTED_CLAIMS", "false").lower() == "true"
+REVOKED_USERS_REFRESH_SECONDS = float(os.getenv("REVOKED_USERS_REFRESH_SECONDS", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Пул для bcrypt: thread или process
+PASSWORD_EXECUTOR = os.getenv("PASSWORD_EXECUTOR", "thread")
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "4"))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+PASSWORD_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_RETRY_AFTER_SECONDS", "1"))
+
 # DATABASE
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "false").lower() == "true"
+# Пул на каждый воркер gunicorn: итоговое число соединений = workers * (pool_size + max_overflow)
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100"))
+# PgBouncer в режиме transaction: отключает кеши подготовленных выражений asyncpg
+DATABASE_PGBOUNCER = os.getenv("DATABASE_PGBOUNCER", "false").lower() == "true"
+# Необязательная реплика для читающих эндпоинтов каталога
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
+DATABASE_READ_MAX_LAG_SECONDS = float(os.getenv("DATABASE_READ_MAX_LAG_SECONDS", "5"))
+DATABASE_READ_CHECK_SECONDS = float(os.getenv("DATABASE_READ_CHECK_SECONDS", "10"))
+DATABASE_READ_CHECK_TIMEOUT_SECONDS = float(os.getenv("DATABASE_READ_CHECK_TIMEOUT_SECONDS", "2"))
+
+# MONITORING
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() == "true"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+# Сколько повторов одного выражения за запрос считать возможным N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+# Доля медленных SELECT, для которых снимается EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+
+# CACHE
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "1024"))
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60"))
+SUGGEST_REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", "300"))
+CATEGORY_CACHE_TTL_SECONDS = float(os.getenv("CATEGORY_CACHE_TTL_SECONDS", "60"))
+
+# SEARCH
+SEARCH_RANK_CANDIDATES = int(os.getenv("SEARCH_RANK_CANDIDATES", "1000"))
+
+# CART
+# database — сразу в cart_items; memory (только один воркер) или redis — с отложенной записью в cart_items
+CART_BACKEND = os.getenv("CART_BACKEND", "database")
+CART_REDIS_URL = os.getenv("CART_REDIS_URL", "redis://localhost:6379/0")
+CART_FLUSH_SECONDS = float(os.getenv("CART_FLUSH_SECONDS", "5"))
+CART_FLUSH_BATCH_SIZE = int(os.getenv("CART_FLUSH_BATCH_SIZE", "100"))
+CART_STORE_TTL_SECONDS = int(os.getenv("CART_STORE_TTL_SECONDS", "86400"))
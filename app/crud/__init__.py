@@ -1,5 +1,6 @@
 from .categories import get_category_by_id, get_categories
-from .products import get_product_by_id, get_products, get_products_pagination
+from .products import (get_product_by_id, get_products, get_products_pagination, get_product_facets,
+                       invalidate_products_cache, invalidate_products_cache_on_commit)
 from .users import get_user_by_email
 from .reviews import get_reviews
 
@@ -9,4 +10,7 @@ __all__ = ['get_category_by_id',
            'get_user_by_email',
            'get_categories',
            'get_reviews',
-           'get_products_pagination']
\ No newline at end of file
+           'get_products_pagination',
+           'get_product_facets',
+           'invalidate_products_cache',
+           'invalidate_products_cache_on_commit']
\ No newline at end of file
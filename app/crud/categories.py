@@ -1,4 +1,4 @@
-from sqlalchemy import select
+from sqlalchemy import select, lambda_stmt
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Sequence
 
@@ -6,8 +6,9 @@ from app.models.categories import Category as CategoryModel
 
 
 async def get_category_by_id(db_session: AsyncSession, category_id: int) -> CategoryModel:
-    category_stmt = select(CategoryModel).where(CategoryModel.id == category_id,
-                                       CategoryModel.is_active == True)
+    # lambda_stmt кеширует построенное выражение: на горячем пути меняется только параметр
+    category_stmt = lambda_stmt(lambda: select(CategoryModel).where(CategoryModel.id == category_id,
+                                                                    CategoryModel.is_active == True))
     category = (await db_session.scalars(category_stmt)).first()
 
     return category
@@ -1,89 +1,442 @@
-from sqlalchemy import select, func, desc
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import event, select, func, desc, and_, or_, literal, literal_column, tuple_, lambda_stmt
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Sequence
+from sqlalchemy.orm import Session
+from typing import Any, Sequence
 
+from app.cache import TTLCache
+from app.config import PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL_SECONDS, SEARCH_RANK_CANDIDATES
+from app.models.categories import CategoryClosure as ClosureModel
 from app.models.products import Product as ProductModel
 
 
+# Общий кеш производных данных каталога (количества, фасеты), сбрасывается при записи товаров
+_products_cache = TTLCache(maxsize=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL_SECONDS)
+
+
 async def get_product_by_id(db_session: AsyncSession, product_id: int) -> ProductModel:
-    product_stmt = select(ProductModel).where(ProductModel.id == product_id,
-                                              ProductModel.is_active == True)
+    # lambda_stmt кеширует построенное выражение: на горячем пути меняется только параметр
+    product_stmt = lambda_stmt(lambda: select(ProductModel).where(ProductModel.id == product_id,
+                                                                  ProductModel.is_active == True))
     product = (await db_session.scalars(product_stmt)).first()
     return product
 
 
-async def get_products(db_session: AsyncSession, category_id: int = None) -> Sequence[ProductModel]:
+def _category_condition(category_id: int, include_descendants: bool = False):
+    """
+    Условие на категорию товара; с include_descendants — на всё поддерево через таблицу замыкания.
+    """
+    if not include_descendants:
+        return ProductModel.category_id == category_id
+
+    return ProductModel.category_id.in_(
+        select(ClosureModel.descendant_id).where(ClosureModel.ancestor_id == category_id)
+    )
+
+
+async def get_products(db_session: AsyncSession,
+                       category_id: int = None,
+                       include_descendants: bool = False) -> Sequence[ProductModel]:
     product_stmt = select(ProductModel).where(ProductModel.is_active == True)
 
     if category_id:
-        product_stmt = product_stmt.where(ProductModel.category_id == category_id)
+        product_stmt = product_stmt.where(_category_condition(category_id, include_descendants))
 
     products = (await db_session.scalars(product_stmt)).all()
 
     return products
 
 
-async def get_products_pagination(
-        db_session: AsyncSession,
-        page: int,
-        page_size: int,
+def _order_keys(sort: str, rank_col=None) -> list[tuple]:
+    """
+    Ключ сортировки выдачи: список (выражение, по убыванию, тип значения в курсоре).
+    Последним всегда идёт id, чтобы порядок был однозначным и курсор указывал на конкретную строку.
+    """
+    if sort == "relevance":
+        return [(rank_col, True, float), (ProductModel.id, False, int)]
+    if sort == "price_asc":
+        return [(ProductModel.price, False, Decimal), (ProductModel.id, False, int)]
+    if sort == "price_desc":
+        return [(ProductModel.price, True, Decimal), (ProductModel.id, True, int)]
+    if sort == "rating":
+        return [(ProductModel.rating, True, float), (ProductModel.id, True, int)]
+    if sort == "newest":
+        return [(ProductModel.id, True, int)]
+
+    return [(ProductModel.id, False, int)]
+
+
+def _encode_cursor(sort: str, search_mode: str | None, values: Sequence) -> str:
+    """
+    Упаковывает ключ сортировки последнего товара страницы в непрозрачный курсор.
+    """
+    payload = json.dumps({"s": sort, "m": search_mode, "v": list(values)}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _read_cursor(cursor: str) -> dict:
+    """
+    Распаковывает курсор в словарь: сортировка (s), режим поиска (m), значения ключа (v).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, dict) or not isinstance(payload.get("v"), list):
+        raise ValueError("Invalid cursor")
+
+    return payload
+
+
+def _coerce_cursor_value(value: Any, value_type: type) -> Any:
+    if isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    if value_type is int and isinstance(value, int):
+        return value
+    if value_type is float and isinstance(value, (int, float)):
+        return float(value)
+    if value_type is Decimal and isinstance(value, str):
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            raise ValueError("Invalid cursor")
+        if number.is_finite():
+            return number
+
+    raise ValueError("Invalid cursor")
+
+
+def _decode_cursor(cursor: str, sort: str, search_mode: str | None, order_keys: list) -> list:
+    """
+    Распаковывает курсор и проверяет, что он выдан для той же сортировки и того же режима поиска.
+    """
+    payload = _read_cursor(cursor)
+    values = payload["v"]
+    if payload.get("s") != sort or payload.get("m") != search_mode or len(values) != len(order_keys):
+        raise ValueError("Cursor does not match the requested ordering")
+
+    return [_coerce_cursor_value(value, value_type) for value, (_, _, value_type) in zip(values, order_keys)]
+
+
+def _keyset_condition(order_keys: list, values: list):
+    """
+    Строит условие «строго после (values)» для лексикографического порядка order_keys.
+    Если все ключи идут в одну сторону, это сравнение строк (price, id) > (:v, :i): его Postgres
+    превращает в границу скана составного индекса. Раскрытая форма через OR нужна только для
+    смешанных направлений (релевантность по убыванию, id по возрастанию).
+    """
+    directions = {descending for _, descending, _ in order_keys}
+    if len(directions) == 1:
+        if len(order_keys) == 1:
+            columns, after_values = order_keys[0][0], values[0]
+        else:
+            columns = tuple_(*[column for column, _, _ in order_keys])
+            after_values = tuple_(*values)
+        return columns < after_values if directions.pop() else columns > after_values
+
+    condition = None
+    for (column, descending, _), value in reversed(list(zip(order_keys, values))):
+        after = column < value if descending else column > value
+        condition = after if condition is None else or_(after, and_(column == value, condition))
+
+    return condition
+
+
+def _build_product_filters(
         category_id: int | None = None,
         search: str | None = None,
         min_price: float | None = None,
         max_price: float | None = None,
         in_stock: bool | None = None,
-        seller_id: int | None = None) -> dict:
+        seller_id: int | None = None,
+        search_mode: str = "fulltext",
+        include_descendants: bool = False) -> tuple[list, Any]:
+    """
+    Собирает условия WHERE для выборки активных товаров и выражение релевантности, если задан поиск.
+    Режим fulltext ищет по tsvector, fuzzy — по триграммам названия (устойчив к опечаткам).
+    """
     filters = [ProductModel.is_active == True]
 
     if category_id is not None:
-        filters.append(ProductModel.category_id == category_id)
+        filters.append(_category_condition(category_id, include_descendants))
     if min_price is not None:
         filters.append(ProductModel.price >= min_price)
     if max_price is not None:
         filters.append(ProductModel.price <= max_price)
     if in_stock is not None:
-        filters.append(ProductModel.stock > 0 if in_stock else ProductModel.stock == 0)
+        # Константу подставляем в SQL как есть, чтобы и generic-план совпадал с предикатом частичного индекса
+        zero = literal_column("0")
+        filters.append(ProductModel.stock > zero if in_stock else ProductModel.stock == zero)
     if seller_id is not None:
         filters.append(ProductModel.seller_id == seller_id)
 
-    total_products_stmt = (select(func.count())
-                           .select_from(ProductModel)
-                           .where(*filters))
-
     rank_col = None
-    if search:
-        search_value = search.strip()
-        if search_value:
-            ts_query = func.websearch_to_tsquery('english', search_value)
-            filters.append(ProductModel.tsv.op('@@')(ts_query))
-            rank_col = func.ts_rank_cd(ProductModel.tsv, ts_query).label("rank")
-            total_products_stmt = select(func.count()).select_from(ProductModel).where(*filters)
-
-    total_products = await db_session.scalar(total_products_stmt) or 0
-
-    if rank_col is not None:
-        products_stmt = (
-            select(ProductModel, rank_col)
-            .where(*filters)
-            .order_by(desc(rank_col), ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-        )
-        rows = (await db_session.execute(products_stmt)).all()
-        products = [row[0] for row in rows]
-    else:
-        products_stmt = (
-            select(ProductModel)
-            .where(*filters)
-            .order_by(ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-        )
-        products = (await db_session.scalars(products_stmt)).all()
+    if search and search_mode == "fuzzy":
+        # <% (word similarity) обслуживается GIN-индексом ix_products_name_trgm
+        filters.append(literal(search).op('<%')(ProductModel.name))
+        rank_col = func.word_similarity(search, ProductModel.name).label("rank")
+    elif search:
+        # Конфигурация — константа SQL, как в вычисляемой колонке tsv: у REGCONFIG нет литерального
+        # представления, а _estimate_count подставляет значения литералами
+        ts_query = func.websearch_to_tsquery(literal_column("'english'"), search)
+        filters.append(ProductModel.tsv.op('@@')(ts_query))
+        rank_col = func.ts_rank_cd(ProductModel.tsv, ts_query).label("rank")
+
+    return filters, rank_col
+
+
+async def _estimate_count(db_session: AsyncSession, stmt) -> int:
+    """
+    Возвращает оценку планировщика (Plan Rows) для числа строк запроса, не выполняя его.
+    """
+    # Значения подставляются литералами с экранированием диалекта сессии, а SQL уходит драйверу как есть,
+    # без разбора параметров: символы вроде ":" и "%" в строке поиска ничего не ломают
+    connection = await db_session.connection()
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def invalidate_products_cache() -> None:
+    """
+    Сбрасывает закешированные данные о списках товаров после изменения товаров.
+    """
+    _products_cache.clear()
+
+
+def invalidate_products_cache_on_commit(db_session: AsyncSession) -> None:
+    """
+    Сбрасывает кеш списков товаров после коммита транзакции db_session, например при переносе категорий:
+    сброс до коммита параллельный запрос успел бы заполнить старыми данными.
+    """
+    db_session.sync_session.info["invalidate_products_cache"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_products_cache_after_commit(session: Session) -> None:
+    if session.info.pop("invalidate_products_cache", False):
+        invalidate_products_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_products_cache_invalidation(session: Session) -> None:
+    session.info.pop("invalidate_products_cache", None)
+
+
+async def get_products_pagination(
+        db_session: AsyncSession,
+        page: int,
+        page_size: int,
+        category_id: int | None = None,
+        search: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool | None = None,
+        seller_id: int | None = None,
+        cursor: str | None = None,
+        count_strategy: str = "exact",
+        search_mode: str = "auto",
+        include_descendants: bool = False,
+        sort: str | None = None,
+        rank_mode: str = "full") -> dict:
+    search_value = search.strip() if search else None
+    fuzzy_fallback = False
+    if not search_value:
+        search_mode = None
+    elif search_mode == "auto":
+        # Продолжение нечёткой выдачи узнаём по курсору, иначе начинаем с полнотекстового поиска
+        if cursor is not None and _read_cursor(cursor).get("m") == "fuzzy":
+            search_mode = "fuzzy"
+        else:
+            search_mode = "fulltext"
+            fuzzy_fallback = cursor is None and page == 1
+
+    filters, rank_col = _build_product_filters(category_id=category_id,
+                                               search=search_value,
+                                               min_price=min_price,
+                                               max_price=max_price,
+                                               in_stock=in_stock,
+                                               seller_id=seller_id,
+                                               search_mode=search_mode,
+                                               include_descendants=include_descendants)
+
+    if sort is None:
+        sort = "relevance" if rank_col is not None else "id"
+
+    # Ограниченное ранжирование: ts_rank_cd считаем только для SEARCH_RANK_CANDIDATES самых новых совпадений,
+    # а не для всех найденных строк. Итог тогда тоже ограничен сверху и отдаётся как «N+».
+    bounded = rank_mode == "bounded" and sort == "relevance"
+    if bounded:
+        candidates = (select(ProductModel.id)
+                      .where(*filters)
+                      .order_by(desc(ProductModel.id))
+                      .limit(SEARCH_RANK_CANDIDATES))
+        filters.append(ProductModel.id.in_(candidates))
+
+    total_products_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+    cache_key = ("count", category_id, include_descendants, search_value or None, search_mode, bounded, min_price,
+                 max_price, in_stock, seller_id)
+
+    total_products = cached_total = None
+    if count_strategy == "estimated":
+        total_products = await _estimate_count(db_session, select(ProductModel.id).where(*filters))
+    elif count_strategy == "cached":
+        total_products = cached_total = _products_cache.get(cache_key)
+
+    order_keys = _order_keys(sort, rank_col)
+    key_columns = [column for column, _, _ in order_keys[:-1]]
+
+    page_filters = list(filters)
+    if cursor is not None:
+        after_values = _decode_cursor(cursor, sort, search_mode, order_keys)
+        page_filters.append(_keyset_condition(order_keys, after_values))
+
+    # Точное количество считаем оконной функцией в том же запросе, что и страницу.
+    # В режиме курсора окно видело бы только строки после курсора, поэтому там нужен отдельный COUNT.
+    window_count = total_products is None and cursor is None
+    extra_columns = [func.count().over().label("total_count")] if window_count else []
+
+    products_stmt = (
+        select(ProductModel, *key_columns, *extra_columns)
+        .where(*page_filters)
+        .order_by(*[desc(column) if descending else column for column, descending, _ in order_keys])
+        .limit(page_size + 1)
+    )
+    if cursor is None:
+        products_stmt = products_stmt.offset((page - 1) * page_size)
+
+    rows = (await db_session.execute(products_stmt)).all()
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    products = [row[0] for row in rows]
+
+    if fuzzy_fallback and not products:
+        return await get_products_pagination(db_session=db_session,
+                                             page=page,
+                                             page_size=page_size,
+                                             category_id=category_id,
+                                             search=search_value,
+                                             min_price=min_price,
+                                             max_price=max_price,
+                                             in_stock=in_stock,
+                                             seller_id=seller_id,
+                                             count_strategy=count_strategy,
+                                             search_mode="fuzzy",
+                                             include_descendants=include_descendants,
+                                             sort=sort if sort != "relevance" else None,
+                                             rank_mode=rank_mode)
+
+    if window_count and rows:
+        total_products = rows[0].total_count
+    if total_products is None:
+        total_products = await db_session.scalar(total_products_stmt) or 0
+    if count_strategy == "cached" and cached_total is None:
+        _products_cache.set(cache_key, total_products)
+
+    next_cursor = None
+    if has_next:
+        last_row = rows[-1]
+        next_cursor = _encode_cursor(sort, search_mode, [*last_row[1:1 + len(key_columns)], last_row[0].id])
 
     return {
         "items": products,
         "total": total_products,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+        "count_strategy": count_strategy,
+        "search_mode": search_mode,
+        "total_is_lower_bound": bounded and total_products >= SEARCH_RANK_CANDIDATES
+    }
+
+
+async def get_product_facets(
+        db_session: AsyncSession,
+        category_id: int | None = None,
+        search: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        in_stock: bool | None = None,
+        seller_id: int | None = None,
+        search_mode: str = "fulltext",
+        include_descendants: bool = False,
+        price_bucket_size: int = 1000) -> dict:
+    """
+    Считает фасеты (категории, продавцы, ценовые корзины, наличие) по текущей выборке
+    одним запросом с GROUPING SETS.
+    """
+    search_value = search.strip() if search else None
+    cache_key = ("facets", category_id, include_descendants, search_value or None, search_mode, min_price,
+                 max_price, in_stock, seller_id, price_bucket_size)
+    facets = _products_cache.get(cache_key)
+    if facets is not None:
+        return facets
+
+    filters, _ = _build_product_filters(category_id=category_id,
+                                        search=search_value,
+                                        min_price=min_price,
+                                        max_price=max_price,
+                                        in_stock=in_stock,
+                                        seller_id=seller_id,
+                                        search_mode=search_mode,
+                                        include_descendants=include_descendants)
+
+    # Выражения в SELECT и GROUP BY должны совпадать текстуально, поэтому без bind-параметров
+    bucket_size = literal_column(str(int(price_bucket_size)))
+    price_bucket = func.floor(ProductModel.price / bucket_size) * bucket_size
+    stock_flag = ProductModel.stock > literal_column("0")
+
+    facets_stmt = (
+        select(ProductModel.category_id,
+               ProductModel.seller_id,
+               price_bucket.label("price_bucket"),
+               stock_flag.label("in_stock"),
+               func.grouping(ProductModel.category_id).label("by_category"),
+               func.grouping(ProductModel.seller_id).label("by_seller"),
+               func.grouping(price_bucket).label("by_price"),
+               func.count().label("items_count"))
+        .where(*filters)
+        .group_by(func.grouping_sets(tuple_(ProductModel.category_id),
+                                     tuple_(ProductModel.seller_id),
+                                     tuple_(price_bucket),
+                                     tuple_(stock_flag)))
+    )
+    rows = (await db_session.execute(facets_stmt)).all()
+
+    facets = {
+        "total": 0,
+        "categories": [],
+        "sellers": [],
+        "price_buckets": [],
+        "in_stock": 0,
+        "out_of_stock": 0,
     }
+    for row in rows:
+        if row.by_category == 0:
+            facets["categories"].append({"category_id": row.category_id, "count": row.items_count})
+        elif row.by_seller == 0:
+            facets["sellers"].append({"seller_id": row.seller_id, "count": row.items_count})
+        elif row.by_price == 0:
+            facets["price_buckets"].append({"min_price": row.price_bucket,
+                                            "max_price": row.price_bucket + price_bucket_size,
+                                            "count": row.items_count})
+        else:
+            facets["in_stock" if row.in_stock else "out_of_stock"] += row.items_count
+            facets["total"] += row.items_count
+
+    facets["categories"].sort(key=lambda facet: (-facet["count"], facet["category_id"]))
+    facets["sellers"].sort(key=lambda facet: (-facet["count"], facet["seller_id"]))
+    facets["price_buckets"].sort(key=lambda facet: facet["min_price"])
+
+    _products_cache.set(cache_key, facets)
+
+    return facets
@@ -1,4 +1,4 @@
-from sqlalchemy import select
+from sqlalchemy import select, lambda_stmt
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Sequence
 
@@ -10,16 +10,17 @@ async def get_reviews(db_session: AsyncSession,
                       user_id: int = None,
                       review_id: int = None,
                       is_active: bool = None) -> Sequence[ReviewModel]:
-    review_stmt = select(ReviewModel)
+    # Каждый набор условий кешируется отдельно: ключ кеша — позиции добавленных лямбд
+    review_stmt = lambda_stmt(lambda: select(ReviewModel))
 
     if product_id:
-        review_stmt = review_stmt.where(ReviewModel.product_id == product_id)
+        review_stmt += lambda s: s.where(ReviewModel.product_id == product_id)
     if user_id:
-        review_stmt = review_stmt.where(ReviewModel.user_id == user_id)
+        review_stmt += lambda s: s.where(ReviewModel.user_id == user_id)
     if review_id:
-        review_stmt = review_stmt.where(ReviewModel.id == review_id)
+        review_stmt += lambda s: s.where(ReviewModel.id == review_id)
     if is_active is not None:
-        review_stmt = review_stmt.where(ReviewModel.is_active == True)
+        review_stmt += lambda s: s.where(ReviewModel.is_active == True)
 
     reviews = (await db_session.scalars(review_stmt)).all()
 
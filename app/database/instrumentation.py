@@ -0,0 +1,116 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import SQL_INSTRUMENTATION, SLOW_REQUEST_MS, N_PLUS_ONE_THRESHOLD
+from app.database.slow_queries import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """
+    Счётчики SQL одного HTTP-запроса: число выражений, суммарное время в базе и разбивка по тексту выражения.
+    """
+    __slots__ = ("started", "count", "db_seconds", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements: dict[str, list] = {}  # текст выражения -> [количество, секунды]
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.db_seconds += seconds
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_sql_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время старта живёт в контексте выполнения, а не в conn.info: упавшее выражение не оставит
+    # его на соединении из пула
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Подключает к движку счётчики выражений для текущего запроса и журнал медленных запросов.
+    """
+    if not SQL_INSTRUMENTATION:
+        return
+
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.add(statement, elapsed)
+        if context is None or context.execution_options.get("slow_query_log", True):
+            slow_query_log.record(engine, statement, parameters, elapsed, executemany)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLInstrumentationMiddleware:
+    """
+    ASGI-middleware: добавляет заголовок Server-Timing с временем в базе, логирует медленные запросы
+    вместе с их SQL и предупреждает о возможном N+1 — одном и том же выражении, повторённом много раз.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_INSTRUMENTATION:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - stats.started) * 1000
+                timing = (f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.count} queries", '
+                          f'app;dur={total_ms:.1f}')
+                message.setdefault("headers", []).append((b"server-timing", timing.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            self._report(scope, stats)
+
+    @staticmethod
+    def _report(scope, stats: RequestStats) -> None:
+        path = f'{scope["method"]} {scope["path"]}'
+        total_ms = (time.perf_counter() - stats.started) * 1000
+
+        for statement, (count, seconds) in stats.statements.items():
+            if count >= N_PLUS_ONE_THRESHOLD:
+                logger.warning("Possible N+1 in %s: statement executed %d times (%.1f ms): %s",
+                               path, count, seconds * 1000, statement)
+
+        if total_ms >= SLOW_REQUEST_MS:
+            details = "\n".join(
+                f"  {count}x {seconds * 1000:.1f} ms: {statement}"
+                for statement, (count, seconds) in sorted(stats.statements.items(), key=lambda item: -item[1][1])
+            )
+            logger.warning("Slow request %s: %.1f ms, %d queries, %.1f ms in DB\n%s",
+                           path, total_ms, stats.count, stats.db_seconds * 1000, details)
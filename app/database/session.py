@@ -1,12 +1,140 @@
+import asyncio
+import logging
+import time
 from collections.abc import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from uuid import uuid4
 
-from app.config import DATABASE_URL
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+from app.config import (DATABASE_URL, DATABASE_ECHO, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW,
+                        DATABASE_POOL_TIMEOUT, DATABASE_POOL_PRE_PING, DATABASE_POOL_RECYCLE,
+                        DATABASE_STATEMENT_CACHE_SIZE, DATABASE_PGBOUNCER, DATABASE_READ_URL,
+                        DATABASE_READ_MAX_LAG_SECONDS, DATABASE_READ_CHECK_SECONDS,
+                        DATABASE_READ_CHECK_TIMEOUT_SECONDS)
+from app.database.pool import InstrumentedAsyncPool
+
+logger = logging.getLogger(__name__)
+
+
+def _connect_args() -> dict:
+    """
+    Параметры подключения asyncpg. За PgBouncer в режиме transaction подготовленные выражения
+    не переживают смену серверного соединения, поэтому кеши выключаются, а имена делаются уникальными.
+    """
+    if DATABASE_PGBOUNCER:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE,
+    }
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=DATABASE_ECHO,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT,
+        pool_pre_ping=DATABASE_POOL_PRE_PING,
+        pool_recycle=DATABASE_POOL_RECYCLE,
+        connect_args=_connect_args(),
+    )
+
+
+async_engine = _create_engine(DATABASE_URL)
 
 async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False, class_=AsyncSession)
 
+async_read_engine = _create_engine(DATABASE_READ_URL) if DATABASE_READ_URL else None
+
+async_read_session_maker = (
+    async_sessionmaker(async_read_engine, expire_on_commit=False, class_=AsyncSession)
+    if async_read_engine is not None else None
+)
+
+# Отставание реплики: 0, если она догнала мастер или это вовсе не реплика
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaHealth:
+    """
+    Периодически проверяет доступность и отставание реплики.
+    Проверка идёт фоновой задачей с таймаутом: запросы её не ждут, а пользуются последним
+    известным состоянием. До первой успешной проверки чтение идёт в основную базу.
+    """
+
+    def __init__(self, max_lag_seconds: float, check_seconds: float, check_timeout_seconds: float):
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self.check_timeout_seconds = check_timeout_seconds
+        self.lag_seconds: float | None = None
+        self.healthy = False
+        self._checked_at: float | None = None
+        self._check_task: asyncio.Task | None = None
+
+    def _is_fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < self.check_seconds
+
+    async def _fetch_lag(self) -> float:
+        async with async_read_session_maker() as session:
+            return float(await session.scalar(_REPLICA_LAG_SQL))
+
+    async def _check(self) -> None:
+        try:
+            # Недоступный хост иначе держал бы проверку до таймаута подключения asyncpg (60 секунд)
+            self.lag_seconds = await asyncio.wait_for(self._fetch_lag(), timeout=self.check_timeout_seconds)
+            self.healthy = self.lag_seconds <= self.max_lag_seconds
+        except Exception:
+            logger.warning("Read replica is unavailable, falling back to primary", exc_info=True)
+            self.lag_seconds = None
+            self.healthy = False
+        finally:
+            self._checked_at = time.monotonic()
+            self._check_task = None
+
+    async def is_usable(self) -> bool:
+        if async_read_session_maker is None:
+            return False
+
+        if not self._is_fresh() and self._check_task is None:
+            self._check_task = asyncio.create_task(self._check())
+
+        return self.healthy
+
+    async def stop(self) -> None:
+        if self._check_task is not None:
+            self._check_task.cancel()
+            try:
+                await self._check_task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "configured": async_read_session_maker is not None,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+        }
+
+
+replica_health = ReplicaHealth(max_lag_seconds=DATABASE_READ_MAX_LAG_SECONDS,
+                               check_seconds=DATABASE_READ_CHECK_SECONDS,
+                               check_timeout_seconds=DATABASE_READ_CHECK_TIMEOUT_SECONDS)
+
 
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -14,3 +142,13 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
     async with async_session_maker() as session:
         yield session
+
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Предоставляет сессию для эндпоинтов только на чтение: реплику, если она задана и не отстаёт,
+    иначе основную базу. Записи через эту сессию делать нельзя.
+    """
+    session_maker = async_read_session_maker if await replica_health.is_usable() else async_session_maker
+    async with session_maker() as session:
+        yield session
@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import hashlib
+import logging
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import SLOW_QUERY_MS, SLOW_QUERY_BUFFER_SIZE, SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Нормализует выражение (литералы -> ?, пробелы схлопнуты), чтобы одинаковые запросы группировались.
+    """
+    normalized = _SPACES.sub(" ", _LITERALS.sub("?", statement)).strip()
+    return hashlib.md5(normalized.encode()).hexdigest()[:16]
+
+
+def _parameters_shape(parameters) -> list[str] | dict[str, str] | None:
+    # Храним только типы параметров: значения могут содержать персональные данные
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+# Изменение данных в любом месте выражения (в том числе в CTE), блокировки строк
+# и функции с побочными эффектами: advisory-блокировки, последовательности, настройки
+_SIDE_EFFECTS = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE)\b"
+    r"|\bFOR\s+(?:KEY\s+)?SHARE\b"
+    r"|\b(?:pg_(?:try_)?advisory\w*|nextval|setval|set_config|pg_notify|pg_sleep\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def _is_explainable(statement: str) -> bool:
+    # EXPLAIN ANALYZE выполняет запрос повторно на другом соединении, пока транзакция запроса ещё открыта:
+    # изменение или блокировка строк там ждали бы блокировок этой транзакции
+    return statement.lstrip().upper().startswith(("SELECT", "WITH")) and not _SIDE_EFFECTS.search(statement)
+
+
+class SlowQueryLog:
+    """
+    Кольцевой буфер медленных SQL-выражений. Для случайной доли записей план снимается
+    через EXPLAIN (ANALYZE, BUFFERS) на отдельном соединении, в фоне и не больше одного одновременно.
+    """
+
+    def __init__(self, threshold_ms: float, maxlen: int, explain_sample_rate: float):
+        self.threshold_seconds = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self._entries: deque[dict] = deque(maxlen=maxlen)
+        self._explaining = False
+        # Цикл событий держит задачи только слабыми ссылками: без этого EXPLAIN мог бы собраться GC на полпути
+        self._explain_tasks: set[asyncio.Task] = set()
+
+    def record(self, engine: AsyncEngine, statement: str, parameters, seconds: float, executemany: bool) -> None:
+        if seconds < self.threshold_seconds:
+            return
+
+        entry = {
+            "fingerprint": fingerprint(statement),
+            "statement": statement,
+            "parameters": _parameters_shape(None if executemany else parameters),
+            "duration_ms": round(seconds * 1000, 3),
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "plan": None,
+        }
+        self._entries.append(entry)
+
+        if (not executemany and not self._explaining and _is_explainable(statement)
+                and random.random() < self.explain_sample_rate):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._explaining = True
+            # Пустой контекст: EXPLAIN не должен попадать в счётчики текущего HTTP-запроса
+            task = loop.create_task(self._explain(engine, entry, statement, parameters),
+                                    context=contextvars.Context())
+            self._explain_tasks.add(task)
+            task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, engine: AsyncEngine, entry: dict, statement: str, parameters) -> None:
+        started = time.perf_counter()
+        try:
+            async with engine.connect() as conn:
+                # Служебные выражения этого соединения сами в журнал не попадают
+                await conn.execution_options(slow_query_log=False)
+                await conn.exec_driver_sql("SET LOCAL statement_timeout = 10000")
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters or ()
+                )
+                entry["plan"] = result.scalar()
+                await conn.rollback()
+        except Exception:
+            logger.warning("Failed to EXPLAIN slow query %s", entry["fingerprint"], exc_info=True)
+        finally:
+            entry["explain_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self._explaining = False
+
+    def entries(self) -> list[dict]:
+        """
+        Возвращает записи от новых к старым.
+        """
+        return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=SLOW_QUERY_MS,
+    maxlen=SLOW_QUERY_BUFFER_SIZE,
+    explain_sample_rate=SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+)
@@ -1,14 +1,32 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
-from app.routers import categories, products, users, reviews, cart, orders
+from app.routers import categories, products, users, reviews, cart, orders, internal
+from app.services import password_service, cart_store, suggest_index
+from app.database.session import async_engine, async_read_engine, replica_health
+from app.database.instrumentation import SQLInstrumentationMiddleware, instrument_engine
 from fastapi.middleware.cors import CORSMiddleware
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await cart_store.start()
+    yield
+    # Дописываем отложенные изменения корзин перед остановкой
+    await cart_store.stop()
+    await suggest_index.stop()
+    await replica_health.stop()
+    # Останавливаем пул bcrypt, чтобы процессы-воркеры не пережили приложение
+    password_service.shutdown()
+
+
 # Создаём приложение FastAPI
 app = FastAPI(
     title="FastAPI Интернет-магазин",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.mount("/media", StaticFiles(directory="media"), name="media")
@@ -20,6 +38,13 @@ app.include_router(users.router)
 app.include_router(reviews.router)
 app.include_router(cart.router)
 app.include_router(orders.router)
+app.include_router(internal.router)
+
+# Счётчики SQL и Server-Timing для каждого запроса
+for engine in (async_engine, async_read_engine):
+    if engine is not None:
+        instrument_engine(engine)
+app.add_middleware(SQLInstrumentationMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,50 @@
+"""Add product listing indexes
+
+Revision ID: 13ebb4ddeaf2
+Revises: 6890a8599434
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '13ebb4ddeaf2'
+down_revision: Union[str, Sequence[str], None] = '6890a8599434'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя индекса, колонки, предикат частичного индекса)
+INDEXES = [
+    ('ix_products_active_id', ['id'], 'is_active'),
+    ('ix_products_active_category_id', ['category_id', 'id'], 'is_active'),
+    ('ix_products_active_seller_id', ['seller_id', 'id'], 'is_active'),
+    ('ix_products_active_price', ['price', 'id'], 'is_active'),
+    ('ix_products_active_category_price', ['category_id', 'price', 'id'], 'is_active'),
+    ('ix_products_active_in_stock_id', ['id'], 'is_active AND stock > 0'),
+    ('ix_products_active_out_of_stock_id', ['id'], 'is_active AND stock = 0'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в products, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(name, 'products', columns, unique=False,
+                            postgresql_where=sa.text(where),
+                            postgresql_concurrently=True,
+                            if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='products',
+                          postgresql_concurrently=True,
+                          if_exists=True)
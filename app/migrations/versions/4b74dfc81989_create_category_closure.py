@@ -0,0 +1,86 @@
+"""Create category closure
+
+Revision ID: 4b74dfc81989
+Revises: 7b04ae0c3a21
+Create Date: 2026-10-18 11:48:05.271936
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b74dfc81989'
+down_revision: Union[str, Sequence[str], None] = '7b04ae0c3a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _find_category_cycles() -> list[int]:
+    """
+    Категории, лежащие на цикле parent_id. Прежний update_category позволял сделать родителем потомка,
+    а рекурсивное заполнение замыкания на таком цикле не завершается.
+    """
+    # Поднимаемся от каждой категории к корню; path не даёт обходу зациклиться
+    return op.get_bind().execute(sa.text("""
+        WITH RECURSIVE walk AS (
+            SELECT id AS start_id, parent_id, ARRAY[id] AS path, false AS is_cycle
+            FROM categories
+            UNION ALL
+            SELECT walk.start_id, categories.parent_id, walk.path || categories.id, categories.id = ANY(walk.path)
+            FROM walk
+            JOIN categories ON categories.id = walk.parent_id
+            WHERE NOT walk.is_cycle
+        )
+        SELECT start_id FROM walk
+        WHERE is_cycle AND path[array_length(path, 1)] = start_id
+        ORDER BY start_id
+    """)).scalars().all()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    cycles = _find_category_cycles()
+    if cycles:
+        raise RuntimeError(
+            f"Category hierarchy contains cycles through categories {cycles}: "
+            "set parent_id of one category in each cycle to NULL and rerun the migration"
+        )
+
+    op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index(op.f('ix_category_closure_descendant_id'), 'category_closure', ['descendant_id'], unique=False)
+
+    # Заполняем замыкание по текущему дереву; неактивные категории в поддеревья не входят
+    op.execute("""
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+            FROM categories
+            UNION ALL
+            SELECT tree.ancestor_id, categories.id, tree.depth + 1
+            FROM tree
+            JOIN categories ON categories.parent_id = tree.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+    op.execute("""
+        DELETE FROM category_closure
+        USING categories
+        WHERE categories.is_active = false
+          AND categories.id IN (category_closure.ancestor_id, category_closure.descendant_id)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_category_closure_descendant_id'), table_name='category_closure')
+    op.drop_table('category_closure')
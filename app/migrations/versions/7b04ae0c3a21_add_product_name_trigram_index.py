@@ -0,0 +1,38 @@
+"""Add product name trigram index
+
+Revision ID: 7b04ae0c3a21
+Revises: 13ebb4ddeaf2
+Create Date: 2026-10-18 11:02:17.640593
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b04ae0c3a21'
+down_revision: Union[str, Sequence[str], None] = '13ebb4ddeaf2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_name_trgm', 'products', ['name'], unique=False,
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'},
+                        postgresql_where=sa.text('is_active'),
+                        postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_name_trgm', table_name='products',
+                      postgresql_concurrently=True,
+                      if_exists=True)
@@ -0,0 +1,44 @@
+"""Add product sort indexes
+
+Revision ID: 7f08380fedc3
+Revises: 4b74dfc81989
+Create Date: 2026-10-18 12:35:52.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f08380fedc3'
+down_revision: Union[str, Sequence[str], None] = '4b74dfc81989'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Сортировки по цене и новизне обслуживают индексы из 13ebb4ddeaf2 (в том числе обратным сканированием)
+INDEXES = [
+    ('ix_products_active_rating', ['rating', 'id']),
+    ('ix_products_active_category_rating', ['category_id', 'rating', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'products', columns, unique=False,
+                            postgresql_where=sa.text('is_active'),
+                            postgresql_concurrently=True,
+                            if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='products',
+                          postgresql_concurrently=True,
+                          if_exists=True)
@@ -1,4 +1,4 @@
-from .categories import Category
+from .categories import Category, CategoryClosure
 from .products import Product
 from .users import User
 from .reviews import Review
@@ -6,6 +6,7 @@ from .cart_items import CartItem
 from .orders import Order, OrderItem
 
 __all__ = ["Category",
+           "CategoryClosure",
            "Product",
            "User",
            "Review",
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Boolean, ForeignKey
+from sqlalchemy import String, Boolean, ForeignKey, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database.base import Base
@@ -16,4 +16,16 @@ class Category(Base):
 
     parent: Mapped["Category | None"] = relationship(back_populates="children",
                                                      remote_side="Category.id")
-    children: Mapped["Category | None"] = relationship(back_populates="parent")
\ No newline at end of file
+    children: Mapped["Category | None"] = relationship(back_populates="parent")
+
+
+class CategoryClosure(Base):
+    """
+    Таблица замыкания иерархии категорий: по строке на каждую пару (предок, потомок), включая саму категорию.
+    """
+    __tablename__ = "category_closure"
+
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True,
+                                               index=True)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
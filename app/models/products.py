@@ -41,4 +41,18 @@ class Product(Base):
 
     __table_args__ = (
         Index("ix_products_tsv_gin", "tsv", postgresql_using="gin"),
+        # Частичные индексы под фильтры и сортировку каталога: в выдачу попадают только активные товары
+        Index("ix_products_active_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_category_id", "category_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_seller_id", "seller_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_price", "price", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_category_price", "category_id", "price", "id",
+              postgresql_where=text("is_active")),
+        Index("ix_products_active_rating", "rating", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_category_rating", "category_id", "rating", "id",
+              postgresql_where=text("is_active")),
+        Index("ix_products_active_in_stock_id", "id", postgresql_where=text("is_active AND stock > 0")),
+        Index("ix_products_active_out_of_stock_id", "id", postgresql_where=text("is_active AND stock = 0")),
+        Index("ix_products_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}, postgresql_where=text("is_active")),
     )
\ No newline at end of file
@@ -1,21 +1,17 @@
-from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Body, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from app.auth import get_current_user
+from app.auth import Principal, get_current_user
 from app.database.session import get_async_db
-from app.models import CartItem as CartItemModel
-from app.models import Product as ProductModel
-from app.models import User as UserModel
 from app.schemas import (
     Cart as CartSchema,
     CartItem as CartItemSchema,
     CartItemCreate,
     CartItemUpdate,
+    CartItemOperation,
+    CartSummary,
 )
-from app.services import get_cart_item, ensure_product_available
+from app.services import cart_store, conditional_response
 
 
 router = APIRouter(prefix="/cart", tags=["cart"])
@@ -23,55 +19,53 @@ router = APIRouter(prefix="/cart", tags=["cart"])
 
 @router.get("/", response_model=CartSchema)
 async def get_cart(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    items = result.all()
-
-    total_quantity = sum(item.quantity for item in items)
-    price_items = (
-        Decimal(item.quantity) *
-        (item.product.price if item.product.price is not None else Decimal("0"))
-        for item in items
-    )
-    total_price_decimal = sum(price_items, Decimal("0"))
-
-    return CartSchema(
-        user_id=current_user.id,
-        items=items,
-        total_quantity=total_quantity,
-        total_price=total_price_decimal
-    )
+    """
+    Возвращает корзину; при совпадении If-None-Match — 304 без загрузки товаров.
+    """
+    version = await cart_store.get_version(db, current_user.id)
+    not_modified = conditional_response(request, response, current_user.id, version)
+    if not_modified is not None:
+        return not_modified
+
+    return await cart_store.get_cart(db, current_user.id)
+
+
+@router.get("/summary", response_model=CartSummary)
+async def get_cart_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Возвращает число позиций, количество товаров и сумму корзины без загрузки самих товаров.
+    """
+    return await cart_store.get_summary(db, current_user.id)
 
 
 @router.post("/items", response_model=CartItemSchema, status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
     payload: CartItemCreate,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    await ensure_product_available(db, payload.product_id)
+    return await cart_store.add_item(db, current_user.id, payload.product_id, payload.quantity)
 
-    cart_item = await get_cart_item(db, current_user.id, payload.product_id)
-    if cart_item:
-        cart_item.quantity += payload.quantity
-    else:
-        cart_item = CartItemModel(
-            user_id=current_user.id,
-            product_id=payload.product_id,
-            quantity=payload.quantity,
-        )
-        db.add(cart_item)
 
-    await db.commit()
-    updated_item = await get_cart_item(db, current_user.id, payload.product_id)
-    return updated_item
+@router.post("/items/batch", response_model=CartSchema)
+async def apply_cart_batch(
+    operations: list[CartItemOperation] = Body(..., min_length=1, max_length=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Применяет пакет операций add/set/remove одной транзакцией и возвращает итоговую корзину.
+    """
+    await cart_store.apply_operations(db, current_user.id, operations)
+    return await cart_store.get_cart(db, current_user.id)
 
 
 @router.put("/items/{product_id}", response_model=CartItemSchema)
@@ -79,18 +73,9 @@ async def update_cart_item(
     product_id: int,
     payload: CartItemUpdate,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    await ensure_product_available(db, product_id)
-
-    cart_item = await get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Cart item not found")
-
-    cart_item.quantity = payload.quantity
-    await db.commit()
-    updated_item = await get_cart_item(db, current_user.id, product_id)
-    return updated_item
+    return await cart_store.set_item_quantity(db, current_user.id, product_id, payload.quantity)
 
 
 
@@ -98,22 +83,16 @@ async def update_cart_item(
 async def remove_item_from_cart(
     product_id: int,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    cart_item = await get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Cart item not found")
-
-    await db.delete(cart_item)
-    await db.commit()
+    await cart_store.remove_item(db, current_user.id, product_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
+    await cart_store.clear(db, current_user.id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
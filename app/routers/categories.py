@@ -3,10 +3,12 @@ from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.categories import Category as CategoryModel
-from app.schemas import Category as CategorySchema, CategoryCreate
+from app.schemas import Category as CategorySchema, CategoryCreate, CategoryTree
 from app.database.session import get_async_db
 
-from app.crud import get_category_by_id, get_categories
+from app.crud import get_category_by_id
+from app.services import (suggest_index, category_cache, add_category_to_hierarchy, move_category_in_hierarchy,
+                          remove_category_from_hierarchy, is_descendant_category)
 
 router = APIRouter(
     prefix="/categories",
@@ -15,15 +17,23 @@ router = APIRouter(
 
 
 @router.get("/", response_model=list[CategorySchema])
-async def get_all_categories(db: AsyncSession = Depends(get_async_db)):
+async def get_all_categories():
     """
     Возвращает список всех категорий товаров.
     """
-    db_categories = await get_categories(db_session=db)
+    db_categories = await category_cache.get_all()
 
     return db_categories
 
 
+@router.get("/tree", response_model=list[CategoryTree])
+async def get_categories_tree():
+    """
+    Возвращает активные категории в виде дерева.
+    """
+    return await category_cache.get_tree()
+
+
 @router.post("/", response_model=CategorySchema, status_code=status.HTTP_201_CREATED)
 async def create_category(category: CategoryCreate, db: AsyncSession = Depends(get_async_db)):
     """
@@ -36,8 +46,12 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
 
     db_category = CategoryModel(**category.model_dump())
     db.add(db_category)
+    await db.flush()
+    await add_category_to_hierarchy(db, category_id=db_category.id, parent_id=db_category.parent_id)
     await db.commit()
     await db.refresh(db_category)
+    suggest_index.upsert("category", db_category.id, db_category.name)
+    category_cache.invalidate()
 
     return db_category
 
@@ -57,14 +71,22 @@ async def update_category(category_id: int, category: CategoryCreate, db: AsyncS
             raise HTTPException(status_code=400, detail="Parent category not found")
         if db_parent_category.id == category_id:
             raise HTTPException(status_code=400, detail="Category can't be it's own parent")
+        if await is_descendant_category(db, category_id=category.parent_id, ancestor_id=category_id):
+            raise HTTPException(status_code=400, detail="Category can't be moved under its own descendant")
+
+    parent_changed = "parent_id" in category.model_fields_set and category.parent_id != db_category.parent_id
 
     await db.execute(
         update(CategoryModel)
         .where(CategoryModel.id == category_id)
         .values(**category.model_dump(exclude_unset=True))
     )
+    if parent_changed:
+        await move_category_in_hierarchy(db, category_id=category_id, parent_id=category.parent_id)
     await db.commit()
     await db.refresh(db_category)
+    suggest_index.upsert("category", db_category.id, db_category.name)
+    category_cache.invalidate()
 
     return db_category
 
@@ -79,7 +101,10 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_async
         raise HTTPException(status_code=404, detail="Category not found")
 
     db_category.is_active = False
+    await remove_category_from_hierarchy(db, category_id=category_id)
     await db.commit()
     await db.refresh(db_category)
+    suggest_index.remove("category", db_category.id)
+    category_cache.invalidate()
 
     return db_category
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+
+from app.auth import get_current_admin, principal_cache, token_cache
+from app.database.session import async_engine, async_read_engine, replica_health
+from app.database.slow_queries import slow_query_log
+from app.services import password_service
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    dependencies=[Depends(get_current_admin)],
+)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Возвращает служебные метрики процесса (только для 'admin').
+    """
+    return {
+        "principal_cache": principal_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "password_service": password_service.stats(),
+        "database_pool": async_engine.pool.stats(),
+        "read_database_pool": async_read_engine.pool.stats() if async_read_engine is not None else None,
+        "read_replica": replica_health.stats(),
+    }
+
+
+@router.get("/slow-queries")
+async def get_slow_queries():
+    """
+    Возвращает последние медленные SQL-выражения с планами, если они были сняты (только для 'admin').
+    """
+    return slow_query_log.entries()
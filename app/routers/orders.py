@@ -1,16 +1,18 @@
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import delete, func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.auth import get_current_user
+from app.auth import Principal, get_current_user
+from app.crud import invalidate_products_cache
 from app.database.session import get_async_db
 from app.models.cart_items import CartItem as CartItemModel
 from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
-from app.models.users import User as UserModel
+from app.models.products import Product as ProductModel
 from app.schemas import Order as OrderSchema, OrderList
+from app.services import cart_store, conditional_response, orders_version
 
 router = APIRouter(
     prefix="/orders",
@@ -29,65 +31,122 @@ async def _load_order_with_items(db: AsyncSession, order_id: int) -> OrderModel
     return result.first()
 
 
-@router.post("/checkout", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
-async def checkout_order(
-        db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_user),
-):
+async def _reserve_stock(db: AsyncSession, user_id: int) -> list:
     """
-    Создаёт заказ на основе текущей корзины пользователя.
-    Сохраняет позиции заказа, вычитает остатки и очищает корзину.
+    Списывает остатки по всем позициям корзины одним условным UPDATE ... RETURNING.
+    Строки товаров предварительно блокируются в порядке id, поэтому параллельные оформления
+    не взаимоблокируются и не уводят остаток в минус. Возвращает списанные позиции в порядке корзины;
+    если их меньше, чем позиций в корзине, часть товаров недоступна.
     """
-    cart_result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
+    cart = (
+        select(CartItemModel.id, CartItemModel.product_id, CartItemModel.quantity)
+        .where(CartItemModel.user_id == user_id)
+        .cte("cart")
     )
-    cart_items = cart_result.all()
-    if not cart_items:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+    locked = (
+        select(ProductModel.id)
+        .where(ProductModel.id.in_(select(cart.c.product_id)))
+        .order_by(ProductModel.id)
+        .with_for_update()
+        .cte("locked")
+    )
+    cart_lines = select(func.count()).select_from(cart).scalar_subquery()
+
+    result = await db.execute(
+        update(ProductModel)
+        .where(
+            ProductModel.id == cart.c.product_id,
+            ProductModel.id.in_(select(locked.c.id)),
+            ProductModel.is_active == True,
+            ProductModel.price.is_not(None),
+            ProductModel.stock >= cart.c.quantity,
+        )
+        .values(stock=ProductModel.stock - cart.c.quantity)
+        .returning(cart.c.id.label("cart_item_id"), ProductModel.id.label("product_id"), ProductModel.price,
+                   cart.c.quantity, cart_lines.label("cart_lines"))
+        .execution_options(synchronize_session=False)
+    )
+    return sorted(result.all(), key=lambda row: row.cart_item_id)
 
-    order = OrderModel(user_id=current_user.id)
-    total_amount = Decimal("0")
 
-    for cart_item in cart_items:
-        product = cart_item.product
+async def _raise_checkout_error(db: AsyncSession, user_id: int, reserved_product_ids: set[int]) -> None:
+    """
+    Редкий путь: определяет, почему корзину нельзя оформить, с прежними текстами ошибок.
+    Успешно списанные позиции пропускаются — их остаток в этой транзакции уже уменьшен.
+    Транзакция откатывается при закрытии сессии.
+    """
+    rows = (await db.execute(
+        select(CartItemModel.product_id, CartItemModel.quantity, ProductModel)
+        .outerjoin(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.user_id == user_id)
+        .order_by(CartItemModel.id)
+    )).all()
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+
+    for product_id, quantity, product in rows:
+        if product_id in reserved_product_ids:
+            continue
         if not product or not product.is_active:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Product {cart_item.product_id} is unavailable",
+                detail=f"Product {product_id} is unavailable",
             )
-        if product.stock < cart_item.quantity:
+        if product.stock < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Not enough stock for product {product.name}",
             )
-
-        unit_price = product.price
-        if unit_price is None:
+        if product.price is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Product {product.name} has no price set",
             )
-        total_price = unit_price * cart_item.quantity
-        total_amount += total_price
 
-        order_item = OrderItemModel(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            unit_price=unit_price,
-            total_price=total_price,
-        )
-        order.items.append(order_item)
+    # Остатки успели пополнить между попытками — клиенту достаточно повторить запрос
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Cart changed during checkout, please retry")
+
+
+@router.post("/checkout", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
+async def checkout_order(
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Создаёт заказ на основе текущей корзины пользователя.
+    Сохраняет позиции заказа, вычитает остатки и очищает корзину.
+    """
+    # Корзина из быстрого хранилища сначала записывается в cart_items этой же транзакцией
+    await cart_store.flush_user(db, current_user.id)
+
+    reserved = await _reserve_stock(db, current_user.id)
+    if not reserved or reserved[0].cart_lines != len(reserved):
+        await _raise_checkout_error(db, current_user.id, {row.product_id for row in reserved})
+
+    order = OrderModel(user_id=current_user.id)
+    total_amount = Decimal("0")
 
-        product.stock -= cart_item.quantity
+    for row in reserved:
+        total_price = row.price * row.quantity
+        total_amount += total_price
+        order.items.append(OrderItemModel(
+            product_id=row.product_id,
+            quantity=row.quantity,
+            unit_price=row.price,
+            total_price=total_price,
+        ))
 
     order.total_amount = total_amount
     db.add(order)
 
     await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
+    detached = await cart_store.detach(current_user.id)
+    try:
+        await db.commit()
+    except Exception:
+        await cart_store.restore(current_user.id, detached)
+        raise
+    invalidate_products_cache()
 
     created_order = await _load_order_with_items(db, order.id)
     if not created_order:
@@ -100,14 +159,22 @@ async def checkout_order(
 
 @router.get("/", response_model=OrderList)
 async def list_orders(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
     Возвращает заказы текущего пользователя с простой пагинацией.
+    При совпадении If-None-Match отвечает 304 после одного запроса версии.
     """
+    version = await orders_version(db, current_user.id) or "empty"
+    not_modified = conditional_response(request, response, current_user.id, version)
+    if not_modified is not None:
+        return not_modified
+
     total = await db.scalar(
         select(func.count(OrderModel.id)).where(OrderModel.user_id == current_user.id)
     )
@@ -127,12 +194,21 @@ async def list_orders(
 @router.get("/{order_id}", response_model=OrderSchema)
 async def get_order(
     order_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
     Возвращает детальную информацию по заказу, если он принадлежит пользователю.
     """
+    # Версия есть только у своего существующего заказа; иначе ниже сработает обычный 404
+    version = await orders_version(db, current_user.id, order_id)
+    if version is not None:
+        not_modified = conditional_response(request, response, current_user.id, version)
+        if not_modified is not None:
+            return not_modified
+
     order = await _load_order_with_items(db, order_id)
     if not order or order.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
@@ -1,17 +1,19 @@
+from typing import Literal
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 
 from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.session import get_async_db
-from app.crud import get_product_by_id, get_category_by_id, get_products, get_products_pagination
+from app.database.session import get_async_db, get_async_read_db
+from app.crud import (get_product_by_id, get_products, get_products_pagination,
+                      get_product_facets, invalidate_products_cache)
 from app.models.products import Product as ProductModel
-from app.models.users import User as UserModel
 
-from app.schemas import Product as ProductSchema, ProductCreate, ProductList
+from app.schemas import Product as ProductSchema, ProductCreate, ProductList, ProductFacets, Suggestion
 
-from app.auth import get_current_seller
+from app.auth import Principal, get_current_seller
 
-from app.services import save_product_image, remove_product_image
+from app.services import save_product_image, remove_product_image, suggest_index, category_cache
 
 
 router = APIRouter(
@@ -26,7 +28,11 @@ async def get_all_products(
         page_size: int = Query(20, ge=1, le=100),
         category_id: int | None = Query(
             None, description="ID категории для фильтрации"),
+        include_descendants: bool = Query(
+            False, description="Учитывать товары всех подкатегорий category_id"),
         search: str | None = Query(None, min_length=1, description="Поиск по названию/описанию"),
+        search_mode: Literal["auto", "fulltext", "fuzzy"] = Query(
+            "auto", description="auto — полнотекстовый поиск с нечётким при пустом результате, fulltext, fuzzy"),
         min_price: float | None = Query(
             None, ge=0, description="Минимальная цена товара"),
         max_price: float | None = Query(
@@ -35,7 +41,15 @@ async def get_all_products(
             None, description="true — только товары в наличии, false — только без остатка"),
         seller_id: int | None = Query(
             None, description="ID продавца для фильтрации"),
-        db: AsyncSession = Depends(get_async_db),
+        rank_mode: Literal["full", "bounded"] = Query(
+            "full", description="bounded — ранжировать только ограниченное число кандидатов (быстро для широких запросов)"),
+        sort: Literal["price_asc", "price_desc", "rating", "newest"] | None = Query(
+            None, description="Сортировка: по цене, рейтингу или новизне; по умолчанию — по релевантности поиска или ID"),
+        cursor: str | None = Query(
+            None, description="Курсор из next_cursor предыдущей страницы (параметр page при этом игнорируется)"),
+        count_strategy: Literal["exact", "estimated", "cached"] = Query(
+            "exact", description="Подсчёт total: exact — точно, estimated — оценка планировщика, cached — кешированное точное"),
+        db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Возвращает список всех активных товаров.
@@ -46,20 +60,85 @@ async def get_all_products(
             detail="min_price не может быть больше max_price",
         )
 
-    db_products = await get_products_pagination(db_session=db,
-                                                page=page,
-                                                page_size=page_size,
-                                                category_id=category_id,
-                                                search=search,
-                                                min_price=min_price,
-                                                max_price=max_price,
-                                                in_stock=in_stock,
-                                                seller_id=seller_id)
+    try:
+        db_products = await get_products_pagination(db_session=db,
+                                                    page=page,
+                                                    page_size=page_size,
+                                                    category_id=category_id,
+                                                    search=search,
+                                                    min_price=min_price,
+                                                    max_price=max_price,
+                                                    in_stock=in_stock,
+                                                    seller_id=seller_id,
+                                                    cursor=cursor,
+                                                    count_strategy=count_strategy,
+                                                    search_mode=search_mode,
+                                                    include_descendants=include_descendants,
+                                                    sort=sort,
+                                                    rank_mode=rank_mode)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
     return db_products
 
 
+@router.get("/facets", response_model=ProductFacets)
+async def get_products_facets(
+        category_id: int | None = Query(
+            None, description="ID категории для фильтрации"),
+        include_descendants: bool = Query(
+            False, description="Учитывать товары всех подкатегорий category_id"),
+        search: str | None = Query(None, min_length=1, description="Поиск по названию/описанию"),
+        search_mode: Literal["fulltext", "fuzzy"] = Query(
+            "fulltext", description="fulltext — полнотекстовый поиск, fuzzy — нечёткий по названию"),
+        min_price: float | None = Query(
+            None, ge=0, description="Минимальная цена товара"),
+        max_price: float | None = Query(
+            None, ge=0, description="Максимальная цена товара"),
+        in_stock: bool | None = Query(
+            None, description="true — только товары в наличии, false — только без остатка"),
+        seller_id: int | None = Query(
+            None, description="ID продавца для фильтрации"),
+        price_bucket_size: int = Query(
+            1000, ge=1, le=1_000_000, description="Ширина ценового диапазона в гистограмме"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает фасеты (категории, продавцы, цены, наличие) для тех же фильтров, что и список товаров.
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price не может быть больше max_price",
+        )
+
+    facets = await get_product_facets(db_session=db,
+                                      category_id=category_id,
+                                      search=search,
+                                      min_price=min_price,
+                                      max_price=max_price,
+                                      in_stock=in_stock,
+                                      seller_id=seller_id,
+                                      search_mode=search_mode,
+                                      include_descendants=include_descendants,
+                                      price_bucket_size=price_bucket_size)
+    return facets
+
+
+@router.get("/suggest", response_model=list[Suggestion])
+async def suggest_products(
+        q: str = Query(..., min_length=1, max_length=100, description="Начало названия товара или категории"),
+        limit: int = Query(10, ge=1, le=50, description="Максимальное количество подсказок"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает подсказки автодополнения из индекса в памяти, без поиска по базе.
+    """
+    await suggest_index.ensure_loaded(db)
+    return suggest_index.search(q, limit)
+
+
 @router.get("/{product_id}", response_model=ProductSchema)
-async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """
     Возвращает детальную информацию о товаре по его ID.
     """
@@ -67,23 +146,25 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db))
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    db_category = await get_category_by_id(db_session=db, category_id=db_product.category_id)
-    if db_category is None:
+    if not await category_cache.exists(db_session=db, category_id=db_product.category_id):
         raise HTTPException(status_code=400, detail="Category not found")
 
     return db_product
 
 
 @router.get("/category/{category_id}", response_model=list[ProductSchema])
-async def get_products_by_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_products_by_category(
+        category_id: int,
+        include_descendants: bool = Query(False, description="Учитывать товары всех подкатегорий"),
+        db: AsyncSession = Depends(get_async_db)):
     """
     Возвращает список товаров в указанной категории по её ID.
     """
-    db_category = await get_category_by_id(db_session=db, category_id=category_id)
-    if db_category is None:
+    if not await category_cache.exists(db_session=db, category_id=category_id):
         raise HTTPException(status_code=404, detail="Category not found")
 
-    db_products = await get_products(db_session=db, category_id=category_id)
+    db_products = await get_products(db_session=db, category_id=category_id,
+                                     include_descendants=include_descendants)
     return db_products
 
 
@@ -92,13 +173,12 @@ async def create_product(
         product: ProductCreate = Depends(ProductCreate.as_form),
         image: UploadFile | None = File(None),
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_seller)
+        current_user: Principal = Depends(get_current_seller)
 ):
     """
     Создаёт новый товар, привязанный к текущему продавцу (только для 'seller').
     """
-    db_category = await get_category_by_id(db_session=db, category_id=product.category_id)
-    if not db_category:
+    if not await category_cache.exists(db_session=db, category_id=product.category_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
 
     image_url = await save_product_image(image) if image else None
@@ -111,6 +191,8 @@ async def create_product(
     db.add(db_product)
     await db.commit()
     await db.refresh(db_product)
+    invalidate_products_cache()
+    suggest_index.upsert("product", db_product.id, db_product.name)
 
     return db_product
 
@@ -121,7 +203,7 @@ async def update_product(
         product: ProductCreate = Depends(ProductCreate.as_form),
         image: UploadFile | None = File(None),
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_seller)
+        current_user: Principal = Depends(get_current_seller)
 ):
     """
     Обновляет товар, если он принадлежит текущему продавцу (только для 'seller').
@@ -132,8 +214,7 @@ async def update_product(
     if db_product.seller_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only update your own products")
 
-    db_category = await get_category_by_id(db_session=db, category_id=product.category_id)
-    if not db_category:
+    if not await category_cache.exists(db_session=db, category_id=product.category_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
 
     await db.execute(
@@ -148,6 +229,8 @@ async def update_product(
 
     await db.commit()
     await db.refresh(db_product)
+    invalidate_products_cache()
+    suggest_index.upsert("product", db_product.id, db_product.name)
 
     return db_product
 
@@ -156,7 +239,7 @@ async def update_product(
 async def delete_product(
         product_id: int,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_seller)
+        current_user: Principal = Depends(get_current_seller)
 ):
     """
     Выполняет мягкое удаление товара, если он принадлежит текущему продавцу (только для 'seller').
@@ -172,5 +255,7 @@ async def delete_product(
 
     await db.commit()
     await db.refresh(db_product)
+    invalidate_products_cache()
+    suggest_index.remove("product", db_product.id)
 
     return db_product
@@ -2,18 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.session import get_async_db
+from app.database.session import get_async_db, get_async_read_db
 
 from app.crud import get_reviews
 from app.crud import get_product_by_id
 
-from app.models.users import User as UserModel
 from app.models import Review as ReviewModel
 
 from app.schemas import ReviewCreate
 from app.schemas import Review as ReviewSchema
 
-from app.auth import get_current_buyer, get_current_admin
+from app.auth import Principal, get_current_buyer, get_current_admin
 from app.services import update_product_rating
 
 router = APIRouter(
@@ -32,7 +31,7 @@ async def get_all_reviews(db: AsyncSession = Depends(get_async_db)):
 
 
 @router.get("/products/{product_id}/reviews", response_model=list[ReviewSchema])
-async def get_all_product_reviews(product_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_all_product_reviews(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
     reviews = await get_reviews(db_session=db, product_id=product_id)
 
     return reviews
@@ -42,7 +41,7 @@ async def get_all_product_reviews(product_id: int, db: AsyncSession = Depends(ge
 async def create_review(
         new_review: ReviewCreate,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_buyer)):
+        current_user: Principal = Depends(get_current_buyer)):
     """
     Создаёт новый отзыв, привязанный к текущему пользователю (только для 'buyer').
     """
@@ -5,10 +5,10 @@ from fastapi.security import OAuth2PasswordRequestForm
 from app.models.users import User as UserModel
 from app.schemas import UserCreate, User as UserSchema
 from app.database.session import get_async_db
-from app.auth import hash_password, verify_password, create_access_token, create_refresh_token
-from app.auth import get_current_user
-from app.config import JWT_SECRET_KEY, JWT_ALGORITHM
+from app.auth import create_access_token, create_refresh_token
+from app.auth import Principal, get_current_user, decode_token
 from app.crud import get_user_by_email
+from app.services import password_service
 
 import jwt
 
@@ -30,7 +30,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)
     # Создание объекта пользователя с хешированным паролем
     db_new_user = UserModel(
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=await password_service.hash(user.password),
         role=user.role
     )
 
@@ -48,7 +48,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
     Аутентифицирует пользователя и возвращает JWT с email, role и id.
     """
     db_user = await get_user_by_email(db_session=db, email=form_data.username, is_active=True)
-    if not db_user or not verify_password(form_data.password, db_user.hashed_password):
+    if not db_user or not await password_service.verify(form_data.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -61,7 +61,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
 
 
 @router.get("/me", response_model=UserSchema)
-async def get_me(current_user: UserModel = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 
@@ -76,7 +76,7 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_async
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(refresh_token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        payload = decode_token(refresh_token)
         email: str = payload.get("sub")
         token_type = payload.get("type")
         if not email or token_type != "refresh":
@@ -1,12 +1,13 @@
-from .categories import Category, CategoryCreate
-from .products import Product, ProductCreate, ProductList
+from .categories import Category, CategoryCreate, CategoryTree
+from .products import Product, ProductCreate, ProductList, ProductFacets, Suggestion
 from .users import User, UserCreate
 from .reviews import Review, ReviewCreate
-from .carts import Cart, CartItem, CartItemCreate, CartItemUpdate
+from .carts import Cart, CartItem, CartItemCreate, CartItemUpdate, CartItemOperation, CartSummary
 from .orders import Order, OrderItem, OrderList
 
 __all__ = ['Category',
            'CategoryCreate',
+           'CategoryTree',
            'Product',
            'ProductCreate',
            'User',
@@ -14,10 +15,14 @@ __all__ = ['Category',
            'Review',
            'ReviewCreate',
            'ProductList',
+           'ProductFacets',
+           'Suggestion',
            'Cart',
            'CartItem',
            'CartItemCreate',
            'CartItemUpdate',
+           'CartItemOperation',
+           'CartSummary',
            'Order',
            'OrderItem',
            'OrderList']
\ No newline at end of file
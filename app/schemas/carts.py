@@ -1,4 +1,5 @@
 from decimal import Decimal
+from typing import Literal
 
 from pydantic import BaseModel, Field, ConfigDict
 from app.schemas import Product
@@ -18,9 +19,17 @@ class CartItemUpdate(BaseModel):
     quantity: int = Field(..., ge=1, description="Новое количество товара")
 
 
+class CartItemOperation(BaseModel):
+    """Операция пакетного изменения корзины."""
+    product_id: int = Field(description="ID товара")
+    quantity: int = Field(1, ge=1, description="Количество (для remove не используется)")
+    mode: Literal["add", "set", "remove"] = Field(
+        "add", description="add — увеличить количество, set — задать количество, remove — удалить позицию")
+
+
 class CartItem(BaseModel):
     """Товар в корзине с данными продукта."""
-    id: int = Field(..., description="ID позиции корзины")
+    id: int | None = Field(None, description="ID позиции корзины (нет, пока позиция не записана в базу)")
     quantity: int = Field(..., ge=1, description="Количество товара")
     product: Product = Field(..., description="Информация о товаре")
 
@@ -35,3 +44,11 @@ class Cart(BaseModel):
     total_price: Decimal = Field(..., ge=0, description="Общая стоимость товаров")
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CartSummary(BaseModel):
+    """Краткая сводка корзины для счётчика в шапке."""
+    user_id: int = Field(..., description="ID пользователя")
+    items_count: int = Field(..., ge=0, description="Количество позиций в корзине")
+    total_quantity: int = Field(..., ge=0, description="Общее количество товаров")
+    total_price: Decimal = Field(..., ge=0, description="Общая стоимость товаров")
@@ -22,3 +22,11 @@ class Category(BaseModel):
     is_active: bool = Field(description="Активность категории")
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CategoryTree(Category):
+    """
+    Категория с вложенными подкатегориями.
+    Используется в GET /categories/tree.
+    """
+    children: list["CategoryTree"] = Field(default_factory=list, description="Дочерние категории")
@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
 from fastapi import Form
 from pydantic import BaseModel, Field, ConfigDict
@@ -61,5 +61,46 @@ class ProductList(BaseModel):
     total: int = Field(ge=0, description="Общее количество товаров")
     page: int = Field(ge=1, description="Номер текущей страницы")
     page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор для запроса следующей страницы, если она есть")
+    count_strategy: str = Field("exact", description="Как посчитан total: exact, estimated или cached")
+    search_mode: str | None = Field(None, description="Каким способом выполнен поиск: fulltext или fuzzy")
+    total_is_lower_bound: bool = Field(False, description="total — нижняя граница («N+»), а не точное количество")
 
-    model_config = ConfigDict(from_attributes=True)  # Для чтения из ORM-объектов
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)  # Для чтения из ORM-объектов
+
+
+class CategoryFacet(BaseModel):
+    category_id: int = Field(description="ID категории")
+    count: int = Field(ge=0, description="Количество товаров в категории")
+
+
+class SellerFacet(BaseModel):
+    seller_id: int = Field(description="ID продавца")
+    count: int = Field(ge=0, description="Количество товаров продавца")
+
+
+class PriceBucketFacet(BaseModel):
+    min_price: Decimal = Field(description="Нижняя граница диапазона цен (включительно)")
+    max_price: Decimal = Field(description="Верхняя граница диапазона цен (не включительно)")
+    count: int = Field(ge=0, description="Количество товаров в диапазоне")
+
+
+class ProductFacets(BaseModel):
+    """
+    Фасеты для боковой панели фильтров по текущей выборке товаров.
+    """
+    total: int = Field(ge=0, description="Общее количество товаров в выборке")
+    categories: list[CategoryFacet] = Field(description="Количество товаров по категориям")
+    sellers: list[SellerFacet] = Field(description="Количество товаров по продавцам")
+    price_buckets: list[PriceBucketFacet] = Field(description="Гистограмма цен")
+    in_stock: int = Field(ge=0, description="Количество товаров в наличии")
+    out_of_stock: int = Field(ge=0, description="Количество товаров без остатка")
+
+
+class Suggestion(BaseModel):
+    """
+    Подсказка автодополнения: товар или категория.
+    """
+    type: Literal["product", "category"] = Field(description="Тип подсказки")
+    id: int = Field(description="ID товара или категории")
+    name: str = Field(description="Название")
@@ -1,8 +1,30 @@
 from .products import update_product_rating, save_product_image, remove_product_image
-from .cart import get_cart_item, ensure_product_available
+from .cart import (get_cart_item, ensure_product_available, upsert_cart_item, set_cart_item_quantity, load_cart,
+                   apply_cart_operations, summarize_cart)
+from .suggest import suggest_index
+from .categories import (add_category_to_hierarchy, move_category_in_hierarchy, remove_category_from_hierarchy,
+                         is_descendant_category, category_cache)
+from .passwords import password_service
+from .cart_store import cart_store
+from .etags import conditional_response, orders_version
 
 __all__ = ["update_product_rating",
            'get_cart_item',
            'ensure_product_available',
+           'upsert_cart_item',
+           'set_cart_item_quantity',
+           'load_cart',
+           'apply_cart_operations',
+           'summarize_cart',
            'save_product_image',
-           'remove_product_image']
\ No newline at end of file
+           'remove_product_image',
+           'suggest_index',
+           'add_category_to_hierarchy',
+           'move_category_in_hierarchy',
+           'remove_category_from_hierarchy',
+           'is_descendant_category',
+           'category_cache',
+           'password_service',
+           'cart_store',
+           'conditional_response',
+           'orders_version']
\ No newline at end of file
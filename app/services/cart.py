@@ -1,10 +1,11 @@
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, exists, literal, literal_column, func
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, contains_eager
 
 from app.models import Product as ProductModel, CartItem as CartItemModel
-from app.schemas import CartItem as CartItemSchema
+from app.schemas import Cart as CartSchema, CartItem as CartItemSchema, CartItemOperation, CartSummary
 
 
 async def ensure_product_available(db: AsyncSession, product_id: int) -> None:
@@ -33,4 +34,200 @@ async def get_cart_item(
             CartItemModel.product_id == product_id,
         )
     )
-    return result.first()
\ No newline at end of file
+    return result.first()
+
+
+async def _fetch_cart_item_with_product(db: AsyncSession, changed) -> CartItemSchema | None:
+    """
+    Выполняет изменяющий CTE и в том же запросе подтягивает товар для ответа.
+    """
+    row = (await db.execute(
+        select(changed.c.id, changed.c.quantity, ProductModel)
+        .join(ProductModel, ProductModel.id == changed.c.product_id)
+    )).first()
+    if row is None:
+        return None
+
+    return CartItemSchema(id=row.id, quantity=row.quantity, product=row.Product)
+
+
+async def upsert_cart_item(
+    db: AsyncSession, user_id: int, product_id: int, quantity: int
+) -> CartItemSchema | None:
+    """
+    Добавляет товар в корзину или увеличивает количество одним запросом (INSERT ... ON CONFLICT).
+    Строка вставляется только для активного товара; None — товар не найден или неактивен.
+    """
+    insert_stmt = insert(CartItemModel).from_select(
+        ["user_id", "product_id", "quantity"],
+        select(literal(user_id), ProductModel.id, literal(quantity))
+        .where(ProductModel.id == product_id, ProductModel.is_active == True),
+    )
+    upsert_stmt = insert_stmt.on_conflict_do_update(
+        constraint="uq_cart_items_user_product",
+        set_={
+            "quantity": CartItemModel.quantity + insert_stmt.excluded.quantity,
+            "updated_at": func.now(),
+        },
+    ).returning(CartItemModel.id, CartItemModel.product_id, CartItemModel.quantity)
+
+    return await _fetch_cart_item_with_product(db, upsert_stmt.cte("upserted"))
+
+
+async def set_cart_item_quantity(
+    db: AsyncSession, user_id: int, product_id: int, quantity: int
+) -> CartItemSchema | None:
+    """
+    Задаёт количество товара в корзине одним запросом, если позиция есть и товар активен; иначе None.
+    """
+    update_stmt = (
+        update(CartItemModel)
+        .where(
+            CartItemModel.user_id == user_id,
+            CartItemModel.product_id == product_id,
+            exists().where(ProductModel.id == CartItemModel.product_id, ProductModel.is_active == True),
+        )
+        .values(quantity=quantity)
+        .returning(CartItemModel.id, CartItemModel.product_id, CartItemModel.quantity)
+    )
+
+    return await _fetch_cart_item_with_product(db, update_stmt.cte("updated"))
+
+
+async def load_cart(db: AsyncSession, user_id: int) -> CartSchema:
+    """
+    Собирает корзину пользователя с товарами и итогами одним запросом:
+    товары подгружаются через JOIN, а итоги считает база оконными функциями.
+    """
+    result = await db.execute(
+        select(
+            CartItemModel,
+            func.sum(CartItemModel.quantity).over().label("total_quantity"),
+            func.sum(CartItemModel.quantity * func.coalesce(ProductModel.price, 0)).over().label("total_price"),
+        )
+        .join(CartItemModel.product)
+        .options(contains_eager(CartItemModel.product))
+        .where(CartItemModel.user_id == user_id)
+        # Тот же порядок, что и у корзин в быстром хранилище
+        .order_by(CartItemModel.product_id)
+    )
+    rows = result.all()
+
+    return CartSchema(
+        user_id=user_id,
+        items=[row.CartItem for row in rows],
+        total_quantity=rows[0].total_quantity if rows else 0,
+        total_price=rows[0].total_price if rows else 0,
+    )
+
+
+async def summarize_cart(db: AsyncSession, user_id: int) -> CartSummary:
+    """
+    Считает число позиций, количество и сумму корзины одним агрегатным запросом без загрузки товаров.
+    """
+    row = (await db.execute(
+        select(
+            func.count(CartItemModel.id).label("items_count"),
+            func.coalesce(func.sum(CartItemModel.quantity), 0).label("total_quantity"),
+            func.coalesce(func.sum(CartItemModel.quantity * func.coalesce(ProductModel.price, 0)), 0)
+            .label("total_price"),
+        )
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.user_id == user_id)
+    )).one()
+
+    return CartSummary(
+        user_id=user_id,
+        items_count=row.items_count,
+        total_quantity=row.total_quantity,
+        total_price=row.total_price,
+    )
+
+
+async def cart_version(db: AsyncSession, user_id: int) -> str:
+    """
+    Версия корзины из cart_items одним запросом: xmin строк позиций и товаров меняется при любом UPDATE.
+    """
+    signature = func.concat_ws(":", CartItemModel.id, CartItemModel.quantity,
+                               literal_column("cart_items.xmin"), literal_column("products.xmin"))
+    return await db.scalar(
+        select(func.coalesce(
+            func.md5(func.string_agg(signature, aggregate_order_by(literal_column("','"), CartItemModel.id))),
+            "empty",
+        ))
+        .select_from(CartItemModel)
+        .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+        .where(CartItemModel.user_id == user_id)
+    )
+
+
+async def ensure_products_available(db: AsyncSession, product_ids) -> None:
+    """
+    Проверяет одним запросом, что все товары существуют и активны; иначе 404 со списком недоступных.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    available = set(await db.scalars(
+        select(ProductModel.id).where(ProductModel.id.in_(product_ids), ProductModel.is_active == True)
+    ))
+    missing = sorted(product_ids - available)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Products not found or inactive: {missing}",
+        )
+
+
+def fold_cart_operations(operations: list[CartItemOperation]) -> dict[int, tuple[str, int]]:
+    """
+    Сворачивает операции по каждому товару в одну итоговую: ("add", n), ("set", n) или ("remove", 0).
+    """
+    folded: dict[int, tuple[str, int]] = {}
+    for operation in operations:
+        previous = folded.get(operation.product_id)
+        if operation.mode == "add" and previous is not None:
+            previous_mode, previous_quantity = previous
+            if previous_mode == "remove":
+                folded[operation.product_id] = ("set", operation.quantity)
+            else:
+                folded[operation.product_id] = (previous_mode, previous_quantity + operation.quantity)
+        elif operation.mode == "remove":
+            folded[operation.product_id] = ("remove", 0)
+        else:
+            folded[operation.product_id] = (operation.mode, operation.quantity)
+    return folded
+
+
+async def apply_cart_operations(db: AsyncSession, user_id: int, operations: list[CartItemOperation]) -> None:
+    """
+    Применяет пакет операций к корзине: одна проверка доступности товаров и по одному запросу
+    на удаление, добавление и установку количества. Коммит делает вызывающий код.
+    set для отсутствующей позиции создаёт её.
+    """
+    folded = fold_cart_operations(operations)
+    upserts = {product_id: change for product_id, change in folded.items() if change[0] != "remove"}
+
+    await ensure_products_available(db, upserts)
+
+    removed = [product_id for product_id, (mode, _) in folded.items() if mode == "remove"]
+    if removed:
+        await db.execute(
+            delete(CartItemModel).where(CartItemModel.user_id == user_id, CartItemModel.product_id.in_(removed))
+        )
+
+    for mode in ("add", "set"):
+        rows = [
+            {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+            for product_id, (change_mode, quantity) in upserts.items() if change_mode == mode
+        ]
+        if not rows:
+            continue
+        insert_stmt = insert(CartItemModel).values(rows)
+        quantity = (CartItemModel.quantity + insert_stmt.excluded.quantity if mode == "add"
+                    else insert_stmt.excluded.quantity)
+        await db.execute(insert_stmt.on_conflict_do_update(
+            constraint="uq_cart_items_user_product",
+            set_={"quantity": quantity, "updated_at": func.now()},
+        ))
@@ -0,0 +1,633 @@
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, literal_column, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (CART_BACKEND, CART_REDIS_URL, CART_FLUSH_SECONDS, CART_FLUSH_BATCH_SIZE,
+                        CART_STORE_TTL_SECONDS)
+from app.crud import get_product_by_id
+from app.database.session import async_session_maker
+from app.models import Product as ProductModel, CartItem as CartItemModel
+from app.schemas import Cart as CartSchema, CartItem as CartItemSchema, CartItemOperation, CartSummary
+from app.services.cart import (upsert_cart_item, set_cart_item_quantity, ensure_product_available,
+                               ensure_products_available, apply_cart_operations, fold_cart_operations,
+                               load_cart, summarize_cart, cart_version)
+
+logger = logging.getLogger(__name__)
+
+# Пространство имён advisory-блокировок корзин: pg_advisory_xact_lock(namespace, user_id)
+_CART_LOCK_NAMESPACE = 7301
+
+
+class _CartExpired(Exception):
+    """Корзина пропала из хранилища (истёк TTL) между загрузкой из базы и изменением."""
+
+
+class CartStore(ABC):
+    """
+    Единый интерфейс корзины для роутеров. Ошибки возвращаются через HTTPException, как в остальных сервисах.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def add_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> CartItemSchema:
+        ...
+
+    @abstractmethod
+    async def set_item_quantity(self, db: AsyncSession, user_id: int, product_id: int,
+                                quantity: int) -> CartItemSchema:
+        ...
+
+    @abstractmethod
+    async def remove_item(self, db: AsyncSession, user_id: int, product_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def clear(self, db: AsyncSession, user_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def apply_operations(self, db: AsyncSession, user_id: int, operations: list[CartItemOperation]) -> None:
+        ...
+
+    @abstractmethod
+    async def get_cart(self, db: AsyncSession, user_id: int) -> CartSchema:
+        ...
+
+    @abstractmethod
+    async def get_summary(self, db: AsyncSession, user_id: int) -> CartSummary:
+        ...
+
+    @abstractmethod
+    async def get_version(self, db: AsyncSession, user_id: int) -> str:
+        """
+        Дешёвая версия корзины для ETag: меняется при изменении позиций или вложенных товаров.
+        """
+
+    async def flush_user(self, db: AsyncSession, user_id: int) -> None:
+        """
+        Записывает корзину пользователя в cart_items в транзакции db (перед оформлением заказа).
+        """
+
+    async def detach(self, user_id: int) -> object:
+        """
+        Очищает закешированную корзину перед фиксацией заказа, пока блокировка корзины ещё держится.
+        Возвращает прежнее состояние для restore, если фиксация не удалась.
+        """
+
+    async def restore(self, user_id: int, detached: object) -> None:
+        """
+        Возвращает корзину, очищенную detach, после отката заказа.
+        """
+
+
+class DatabaseCartStore(CartStore):
+    """
+    Корзина напрямую в cart_items: каждое изменение — отдельный коммит.
+    """
+
+    async def add_item(self, db, user_id, product_id, quantity):
+        cart_item = await upsert_cart_item(db, user_id, product_id, quantity)
+        if cart_item is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found or inactive",
+            )
+
+        await db.commit()
+        return cart_item
+
+    async def set_item_quantity(self, db, user_id, product_id, quantity):
+        cart_item = await set_cart_item_quantity(db, user_id, product_id, quantity)
+        if cart_item is None:
+            # Промах — редкий путь: отдельным запросом уточняем, какая из двух ошибок
+            await ensure_product_available(db, product_id)
+            raise HTTPException(status_code=404, detail="Cart item not found")
+
+        await db.commit()
+        return cart_item
+
+    async def remove_item(self, db, user_id, product_id):
+        deleted = await db.scalar(
+            delete(CartItemModel)
+            .where(CartItemModel.user_id == user_id, CartItemModel.product_id == product_id)
+            .returning(CartItemModel.id)
+        )
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Cart item not found")
+
+        await db.commit()
+
+    async def clear(self, db, user_id):
+        await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        await db.commit()
+
+    async def apply_operations(self, db, user_id, operations):
+        await apply_cart_operations(db, user_id, operations)
+        await db.commit()
+
+    async def get_cart(self, db, user_id):
+        return await load_cart(db, user_id)
+
+    async def get_summary(self, db, user_id):
+        return await summarize_cart(db, user_id)
+
+    async def get_version(self, db, user_id):
+        return await cart_version(db, user_id)
+
+
+async def _lock_carts(db: AsyncSession, user_ids) -> None:
+    # Сортировка исключает взаимную блокировку между фоновой записью и оформлением заказа
+    for user_id in sorted(user_ids):
+        await db.execute(text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"),
+                         {"namespace": _CART_LOCK_NAMESPACE, "user_id": user_id})
+
+
+async def _persist_carts(db: AsyncSession, carts: dict[int, dict[int, int]]) -> None:
+    """
+    Приводит cart_items указанных пользователей к состоянию хранилища: удаляет лишние строки
+    и вставляет/обновляет остальные. Товары, которых уже нет в базе, пропускаются.
+    """
+    product_ids = {product_id for items in carts.values() for product_id in items}
+    existing = set(await db.scalars(select(ProductModel.id).where(ProductModel.id.in_(product_ids)))) \
+        if product_ids else set()
+    pairs = [(user_id, product_id) for user_id, items in carts.items() for product_id in items
+             if product_id in existing]
+
+    delete_stmt = delete(CartItemModel).where(CartItemModel.user_id.in_(carts))
+    if pairs:
+        delete_stmt = delete_stmt.where(tuple_(CartItemModel.user_id, CartItemModel.product_id).not_in(pairs))
+    await db.execute(delete_stmt)
+
+    if pairs:
+        insert_stmt = insert(CartItemModel).values([
+            {"user_id": user_id, "product_id": product_id, "quantity": carts[user_id][product_id]}
+            for user_id, product_id in pairs
+        ])
+        await db.execute(insert_stmt.on_conflict_do_update(
+            constraint="uq_cart_items_user_product",
+            set_={"quantity": insert_stmt.excluded.quantity, "updated_at": func.now()},
+            where=CartItemModel.quantity != insert_stmt.excluded.quantity,
+        ))
+
+
+class KeyValueCartStore(CartStore):
+    """
+    Корзины в быстром хранилище ключ-значение с отложенной записью в cart_items.
+    Корзина загружается из базы при первом обращении, изменения помечают её «грязной»,
+    а фоновая задача раз в flush_seconds сохраняет грязные корзины. Перед оформлением заказа
+    корзина записывается синхронно, поэтому на checkout источник правды — Postgres.
+    """
+
+    def __init__(self, flush_seconds: float, flush_batch_size: int):
+        self.flush_seconds = flush_seconds
+        self.flush_batch_size = flush_batch_size
+        self._flush_task: asyncio.Task | None = None
+
+    # Примитивы хранилища; все изменяющие операции помечают корзину грязной.
+    # Изменения позиций не создают корзину заново: если её уже нет, они бросают _CartExpired
+
+    @abstractmethod
+    async def _read(self, user_id: int) -> dict[int, int] | None:
+        """Корзина {product_id: quantity} или None, если она ещё не загружена."""
+
+    @abstractmethod
+    async def _init(self, user_id: int, items: dict[int, int]) -> dict[int, int]:
+        """Сохраняет загруженную из базы корзину, если её ещё нет, и возвращает актуальную."""
+
+    @abstractmethod
+    async def _increment(self, user_id: int, product_id: int, quantity: int) -> int:
+        ...
+
+    @abstractmethod
+    async def _set(self, user_id: int, product_id: int, quantity: int) -> None:
+        ...
+
+    @abstractmethod
+    async def _delete(self, user_id: int, product_ids: list[int]) -> int:
+        ...
+
+    @abstractmethod
+    async def _apply_changes(self, user_id: int, changes: dict[int, tuple[str, int]]) -> None:
+        ...
+
+    @abstractmethod
+    async def _replace(self, user_id: int, items: dict[int, int]) -> None:
+        ...
+
+    @abstractmethod
+    async def _pop_dirty(self, limit: int) -> list[int]:
+        ...
+
+    @abstractmethod
+    async def _mark_dirty(self, user_ids: list[int]) -> None:
+        ...
+
+    @abstractmethod
+    async def _drop(self, user_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def _reset(self, user_id: int) -> None:
+        """Заменяет корзину загруженной пустой и снимает с неё пометку грязной."""
+
+    async def _ensure_loaded(self, db: AsyncSession, user_id: int) -> dict[int, int]:
+        items = await self._read(user_id)
+        if items is None:
+            rows = await db.execute(
+                select(CartItemModel.product_id, CartItemModel.quantity)
+                .where(CartItemModel.user_id == user_id)
+                .order_by(CartItemModel.id)
+            )
+            items = await self._init(user_id, dict(rows.all()))
+        return items
+
+    async def _modify(self, db: AsyncSession, user_id: int, change):
+        """
+        Загружает корзину и применяет change(items). Если корзина истекла между загрузкой и изменением,
+        загружает её заново: иначе в хранилище осталась бы корзина из одной позиции, а запись в базу
+        удалила бы остальные позиции пользователя.
+        """
+        while True:
+            items = await self._ensure_loaded(db, user_id)
+            try:
+                return await change(items)
+            except _CartExpired:
+                continue
+
+    async def _get_active_product(self, db: AsyncSession, product_id: int) -> ProductModel:
+        product = await get_product_by_id(db, product_id)
+        if product is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found or inactive",
+            )
+        return product
+
+    async def add_item(self, db, user_id, product_id, quantity):
+        product = await self._get_active_product(db, product_id)
+        new_quantity = await self._modify(db, user_id, lambda items: self._increment(user_id, product_id, quantity))
+        return CartItemSchema(id=None, quantity=new_quantity, product=product)
+
+    async def set_item_quantity(self, db, user_id, product_id, quantity):
+        product = await self._get_active_product(db, product_id)
+
+        async def change(items):
+            if product_id not in items:
+                raise HTTPException(status_code=404, detail="Cart item not found")
+            await self._set(user_id, product_id, quantity)
+
+        await self._modify(db, user_id, change)
+        return CartItemSchema(id=None, quantity=quantity, product=product)
+
+    async def remove_item(self, db, user_id, product_id):
+        if not await self._modify(db, user_id, lambda items: self._delete(user_id, [product_id])):
+            raise HTTPException(status_code=404, detail="Cart item not found")
+
+    async def clear(self, db, user_id):
+        await self._replace(user_id, {})
+
+    async def apply_operations(self, db, user_id, operations):
+        folded = fold_cart_operations(operations)
+        await ensure_products_available(
+            db, [product_id for product_id, (mode, _) in folded.items() if mode != "remove"]
+        )
+        # set для отсутствующей позиции создаёт её, как и в базе
+        await self._modify(db, user_id, lambda items: self._apply_changes(user_id, folded))
+
+    async def get_cart(self, db, user_id):
+        items = await self._ensure_loaded(db, user_id)
+        products = {}
+        if items:
+            products = {product.id: product for product in
+                        await db.scalars(select(ProductModel).where(ProductModel.id.in_(items)))}
+
+        cart_items = [
+            CartItemSchema(id=None, quantity=quantity, product=products[product_id])
+            for product_id, quantity in sorted(items.items()) if product_id in products
+        ]
+        return CartSchema(
+            user_id=user_id,
+            items=cart_items,
+            total_quantity=sum(item.quantity for item in cart_items),
+            total_price=sum((item.quantity * item.product.price for item in cart_items), 0),
+        )
+
+    async def get_summary(self, db, user_id):
+        items = await self._ensure_loaded(db, user_id)
+        prices = {}
+        if items:
+            prices = dict((await db.execute(
+                select(ProductModel.id, func.coalesce(ProductModel.price, 0)).where(ProductModel.id.in_(items))
+            )).all())
+
+        present = {product_id: quantity for product_id, quantity in items.items() if product_id in prices}
+        return CartSummary(
+            user_id=user_id,
+            items_count=len(present),
+            total_quantity=sum(present.values()),
+            total_price=sum((quantity * prices[product_id] for product_id, quantity in present.items()), 0),
+        )
+
+    async def get_version(self, db, user_id):
+        items = await self._ensure_loaded(db, user_id)
+        if not items:
+            return "empty"
+
+        # Версии товаров берём из xmin, как и в DatabaseCartStore
+        products = await db.scalar(
+            select(func.string_agg(func.concat_ws(":", ProductModel.id, literal_column("products.xmin")),
+                                   aggregate_order_by(literal_column("','"), ProductModel.id)))
+            .where(ProductModel.id.in_(items))
+        )
+        signature = f"{sorted(items.items())}|{products}"
+        return hashlib.md5(signature.encode()).hexdigest()
+
+    async def flush_user(self, db, user_id):
+        # Блокировка держится до конца транзакции заказа: фоновая запись не вернёт старую корзину
+        await _lock_carts(db, [user_id])
+        items = await self._read(user_id)
+        if items is not None:
+            await _persist_carts(db, {user_id: items})
+
+    async def detach(self, user_id):
+        # До commit, под блокировкой из flush_user: фоновая запись, ждущая эту блокировку,
+        # прочитает уже пустую корзину и не вернёт оформленные позиции в cart_items
+        items = await self._read(user_id)
+        await self._reset(user_id)
+        return items
+
+    async def restore(self, user_id, detached):
+        if detached is None:
+            await self._drop(user_id)
+        else:
+            # Корзина снова грязная: фоновая запись сохранит её, даже если успела прочитать пустую
+            await self._replace(user_id, detached)
+
+    async def flush_dirty(self) -> int:
+        """
+        Записывает в базу одну пачку грязных корзин. Возвращает число обработанных пользователей.
+        """
+        user_ids = await self._pop_dirty(self.flush_batch_size)
+        if not user_ids:
+            return 0
+
+        try:
+            async with async_session_maker() as db:
+                await _lock_carts(db, user_ids)
+                # Читаем после блокировки: корзина, уже оформленная в заказ, к этому моменту сброшена
+                carts = {}
+                for user_id in user_ids:
+                    items = await self._read(user_id)
+                    if items is not None:
+                        carts[user_id] = items
+                if carts:
+                    await _persist_carts(db, carts)
+                await db.commit()
+        except Exception:
+            await self._mark_dirty(user_ids)
+            raise
+
+        return len(user_ids)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                while await self.flush_dirty() == self.flush_batch_size:
+                    pass
+            except Exception:
+                logger.exception("Failed to flush carts to the database")
+
+    async def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        try:
+            while await self.flush_dirty():
+                pass
+        except Exception:
+            logger.exception("Failed to flush carts on shutdown")
+
+
+class MemoryCartStore(KeyValueCartStore):
+    """
+    Корзины в памяти процесса. Подходит только для одного воркера: у каждого процесса своя копия,
+    а несохранённые изменения теряются при падении процесса.
+    """
+
+    def __init__(self, flush_seconds: float, flush_batch_size: int):
+        super().__init__(flush_seconds, flush_batch_size)
+        self._carts: dict[int, dict[int, int]] = {}
+        self._dirty: set[int] = set()
+
+    async def _read(self, user_id):
+        items = self._carts.get(user_id)
+        return dict(items) if items is not None else None
+
+    async def _init(self, user_id, items):
+        return dict(self._carts.setdefault(user_id, items))
+
+    async def _increment(self, user_id, product_id, quantity):
+        items = self._carts.setdefault(user_id, {})
+        items[product_id] = items.get(product_id, 0) + quantity
+        self._dirty.add(user_id)
+        return items[product_id]
+
+    async def _set(self, user_id, product_id, quantity):
+        self._carts.setdefault(user_id, {})[product_id] = quantity
+        self._dirty.add(user_id)
+
+    async def _delete(self, user_id, product_ids):
+        items = self._carts.setdefault(user_id, {})
+        removed = sum(items.pop(product_id, None) is not None for product_id in product_ids)
+        self._dirty.add(user_id)
+        return removed
+
+    async def _apply_changes(self, user_id, changes):
+        items = self._carts.setdefault(user_id, {})
+        for product_id, (mode, quantity) in changes.items():
+            if mode == "remove":
+                items.pop(product_id, None)
+            elif mode == "add":
+                items[product_id] = items.get(product_id, 0) + quantity
+            else:
+                items[product_id] = quantity
+        self._dirty.add(user_id)
+
+    async def _replace(self, user_id, items):
+        self._carts[user_id] = dict(items)
+        self._dirty.add(user_id)
+
+    async def _pop_dirty(self, limit):
+        return [self._dirty.pop() for _ in range(min(limit, len(self._dirty)))]
+
+    async def _mark_dirty(self, user_ids):
+        self._dirty.update(user_ids)
+
+    async def _drop(self, user_id):
+        self._carts.pop(user_id, None)
+        self._dirty.discard(user_id)
+
+    async def _reset(self, user_id):
+        self._carts[user_id] = {}
+        self._dirty.discard(user_id)
+
+
+class RedisCartStore(KeyValueCartStore):
+    """
+    Корзины в Redis: хеш cart:{user_id} с полями product_id -> quantity и множество грязных корзин.
+    Общее для всех воркеров. Для локальной разработки вместо сервера подходит fakeredis (URL fakeredis://).
+    """
+
+    # Служебное поле хеша: отличает загруженную пустую корзину от незагруженной
+    _LOADED_FIELD = "loaded"
+
+    def __init__(self, url: str, ttl_seconds: int, flush_seconds: float, flush_batch_size: int):
+        super().__init__(flush_seconds, flush_batch_size)
+        self.ttl_seconds = ttl_seconds
+        if url.startswith("fakeredis://"):
+            from fakeredis import FakeAsyncRedis
+            self._redis = FakeAsyncRedis(decode_responses=True)
+        else:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(url, decode_responses=True)
+        self._dirty_key = "cart:dirty"
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"cart:{user_id}"
+
+    def _decode(self, raw: dict) -> dict[int, int] | None:
+        if self._LOADED_FIELD not in raw:
+            return None
+        return {int(field): int(value) for field, value in raw.items() if field != self._LOADED_FIELD}
+
+    async def _read(self, user_id):
+        return self._decode(await self._redis.hgetall(self._key(user_id)))
+
+    async def _init(self, user_id, items):
+        from redis.exceptions import WatchError
+
+        key = self._key(user_id)
+        async with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    current = self._decode(await pipe.hgetall(key))
+                    if current is not None:
+                        return current
+                    pipe.multi()
+                    pipe.hset(key, mapping={self._LOADED_FIELD: 1, **{str(pid): qty for pid, qty in items.items()}})
+                    pipe.expire(key, self.ttl_seconds)
+                    await pipe.execute()
+                    return items
+                except WatchError:
+                    continue
+
+    async def _write(self, user_id, change, require_loaded: bool = True) -> list:
+        from redis.exceptions import WatchError
+
+        # Изменение, продление TTL и пометка грязной корзины — одной транзакцией. WATCH гарантирует,
+        # что ключ не истёк между проверкой загруженности и записью
+        key = self._key(user_id)
+        async with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if require_loaded and not await pipe.hexists(key, self._LOADED_FIELD):
+                        raise _CartExpired
+                    pipe.multi()
+                    change(pipe, key)
+                    pipe.hset(key, self._LOADED_FIELD, 1)
+                    pipe.expire(key, self.ttl_seconds)
+                    pipe.sadd(self._dirty_key, user_id)
+                    return await pipe.execute()
+                except WatchError:
+                    continue
+
+    async def _increment(self, user_id, product_id, quantity):
+        results = await self._write(user_id, lambda pipe, key: pipe.hincrby(key, str(product_id), quantity))
+        return int(results[0])
+
+    async def _set(self, user_id, product_id, quantity):
+        await self._write(user_id, lambda pipe, key: pipe.hset(key, str(product_id), quantity))
+
+    async def _delete(self, user_id, product_ids):
+        results = await self._write(user_id, lambda pipe, key: pipe.hdel(key, *map(str, product_ids)))
+        return int(results[0])
+
+    async def _apply_changes(self, user_id, changes):
+        def change(pipe, key):
+            for product_id, (mode, quantity) in changes.items():
+                if mode == "remove":
+                    pipe.hdel(key, str(product_id))
+                elif mode == "add":
+                    pipe.hincrby(key, str(product_id), quantity)
+                else:
+                    pipe.hset(key, str(product_id), quantity)
+
+        await self._write(user_id, change)
+
+    async def _replace(self, user_id, items):
+        def change(pipe, key):
+            pipe.delete(key)
+            if items:
+                pipe.hset(key, mapping={str(product_id): quantity for product_id, quantity in items.items()})
+
+        # Замена целиком не зависит от прежнего содержимого, поэтому может создать корзину заново
+        await self._write(user_id, change, require_loaded=False)
+
+    async def _pop_dirty(self, limit):
+        return [int(user_id) for user_id in await self._redis.spop(self._dirty_key, limit) or []]
+
+    async def _mark_dirty(self, user_ids):
+        if user_ids:
+            await self._redis.sadd(self._dirty_key, *user_ids)
+
+    async def _drop(self, user_id):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(user_id))
+            pipe.srem(self._dirty_key, user_id)
+            await pipe.execute()
+
+    async def _reset(self, user_id):
+        key = self._key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, self._LOADED_FIELD, 1)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.srem(self._dirty_key, user_id)
+            await pipe.execute()
+
+    async def stop(self) -> None:
+        await super().stop()
+        await self._redis.aclose()
+
+
+def create_cart_store() -> CartStore:
+    if CART_BACKEND == "database":
+        return DatabaseCartStore()
+    if CART_BACKEND == "memory":
+        return MemoryCartStore(flush_seconds=CART_FLUSH_SECONDS, flush_batch_size=CART_FLUSH_BATCH_SIZE)
+    if CART_BACKEND == "redis":
+        return RedisCartStore(url=CART_REDIS_URL, ttl_seconds=CART_STORE_TTL_SECONDS,
+                              flush_seconds=CART_FLUSH_SECONDS, flush_batch_size=CART_FLUSH_BATCH_SIZE)
+    raise ValueError(f"Unknown cart backend: {CART_BACKEND}")
+
+
+cart_store = create_cart_store()
@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+from sqlalchemy import delete, insert, select, literal, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.config import CATEGORY_CACHE_TTL_SECONDS
+from app.crud import get_category_by_id, invalidate_products_cache_on_commit
+from app.database.session import async_session_maker
+from app.models import Category as CategoryModel, CategoryClosure as ClosureModel
+from app.schemas import Category as CategorySchema
+
+
+async def add_category_to_hierarchy(db_session: AsyncSession, category_id: int, parent_id: int | None) -> None:
+    """
+    Добавляет новую категорию в таблицу замыкания: связь с собой и со всеми предками родителя.
+    """
+    await db_session.execute(
+        insert(ClosureModel).values(ancestor_id=category_id, descendant_id=category_id, depth=0)
+    )
+    if parent_id is not None:
+        await db_session.execute(
+            insert(ClosureModel).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(ClosureModel.ancestor_id, literal(category_id), ClosureModel.depth + 1)
+                .where(ClosureModel.descendant_id == parent_id)
+            )
+        )
+
+
+async def move_category_in_hierarchy(db_session: AsyncSession, category_id: int, parent_id: int | None) -> None:
+    """
+    Переносит поддерево категории под нового родителя (или в корень, если parent_id не задан).
+    Закешированные количества товаров с include_descendants сбрасываются после коммита.
+    """
+    invalidate_products_cache_on_commit(db_session)
+    # Алиас нужен, чтобы подзапрос не скоррелировался с целевой таблицей DELETE
+    subtree_links = aliased(ClosureModel)
+    subtree = select(subtree_links.descendant_id).where(subtree_links.ancestor_id == category_id)
+
+    # Рвём связи поддерева со старыми предками, внутренние связи поддерева остаются
+    await db_session.execute(
+        delete(ClosureModel).where(
+            ClosureModel.descendant_id.in_(subtree),
+            ClosureModel.ancestor_id.not_in(subtree),
+        )
+    )
+    if parent_id is not None:
+        ancestors = aliased(ClosureModel)
+        descendants = aliased(ClosureModel)
+        await db_session.execute(
+            insert(ClosureModel).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(ancestors.ancestor_id, descendants.descendant_id, ancestors.depth + descendants.depth + 1)
+                .join(descendants, true())
+                .where(ancestors.descendant_id == parent_id, descendants.ancestor_id == category_id)
+            )
+        )
+
+
+async def remove_category_from_hierarchy(db_session: AsyncSession, category_id: int) -> None:
+    """
+    Убирает деактивированную категорию из замыкания. Её дочерние категории остаются в поддереве её предков.
+    """
+    invalidate_products_cache_on_commit(db_session)
+    await db_session.execute(
+        delete(ClosureModel).where(
+            (ClosureModel.ancestor_id == category_id) | (ClosureModel.descendant_id == category_id)
+        )
+    )
+
+
+async def is_descendant_category(db_session: AsyncSession, category_id: int, ancestor_id: int) -> bool:
+    """
+    Проверяет, входит ли category_id в поддерево ancestor_id (включая саму категорию).
+    """
+    link = await db_session.scalar(
+        select(ClosureModel.depth).where(ClosureModel.ancestor_id == ancestor_id,
+                                         ClosureModel.descendant_id == category_id)
+    )
+    return link is not None
+
+
+class CategoryCache:
+    """
+    Снимок категорий в памяти процесса: список активных, поиск по ID и дерево.
+    Запись категорий увеличивает version, и следующий запрос перечитывает снимок одним SELECT.
+    TTL ограничивает устаревание, когда категорию изменили в другом воркере; категория, которой нет
+    в снимке, ищется в базе, поэтому новая категория из другого воркера видна сразу.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._by_id: dict[int, CategorySchema] = {}
+        self._tree: list[dict] = []
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self.version += 1
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_version == self.version and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _ensure_loaded(self) -> None:
+        if self._is_fresh():
+            return
+
+        async with self._lock:
+            if self._is_fresh():
+                return
+
+            version = self.version
+            # Снимок общий для всех запросов и живёт весь TTL: читаем его с основной базы, а не с реплики,
+            # которая может ещё не увидеть только что записанную категорию
+            async with async_session_maker() as db_session:
+                categories = (await db_session.scalars(select(CategoryModel).order_by(CategoryModel.id))).all()
+            parents = {category.id: category.parent_id for category in categories}
+            by_id = {category.id: CategorySchema.model_validate(category)
+                     for category in categories if category.is_active}
+
+            nodes = {category_id: {**category.model_dump(), "children": []} for category_id, category in by_id.items()}
+            tree = []
+            for category_id, node in nodes.items():
+                # Дочерние категории деактивированной категории поднимаются к ближайшему активному предку
+                parent_id = parents[category_id]
+                while parent_id is not None and parent_id not in nodes:
+                    parent_id = parents.get(parent_id)
+                (nodes[parent_id]["children"] if parent_id is not None else tree).append(node)
+
+            self._by_id, self._tree = by_id, tree
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+
+    async def get_all(self) -> list[CategorySchema]:
+        await self._ensure_loaded()
+        return list(self._by_id.values())
+
+    async def get(self, db_session: AsyncSession, category_id: int) -> CategorySchema | None:
+        await self._ensure_loaded()
+        category = self._by_id.get(category_id)
+        if category is None:
+            # Категорию могли создать в другом воркере после загрузки снимка: проверяем по базе
+            db_category = await get_category_by_id(db_session, category_id)
+            if db_category is not None:
+                self.invalidate()
+                category = CategorySchema.model_validate(db_category)
+        return category
+
+    async def exists(self, db_session: AsyncSession, category_id: int) -> bool:
+        return await self.get(db_session, category_id) is not None
+
+    async def get_tree(self) -> list[dict]:
+        await self._ensure_loaded()
+        return self._tree
+
+
+category_cache = CategoryCache(ttl=CATEGORY_CACHE_TTL_SECONDS)
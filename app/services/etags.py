@@ -0,0 +1,49 @@
+from fastapi import Request, Response, status
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Order as OrderModel, OrderItem as OrderItemModel, Product as ProductModel
+
+
+def _if_none_match(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def conditional_response(request: Request, response: Response, user_id: int, version: str) -> Response | None:
+    """
+    Проставляет ETag ответа и возвращает 304, если клиент прислал тот же тег в If-None-Match.
+    """
+    etag = f'"{user_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _if_none_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
+async def orders_version(db: AsyncSession, user_id: int, order_id: int | None = None) -> str | None:
+    """
+    Версия заказов пользователя (или одного заказа) одним запросом без загрузки связей.
+    Системный столбец xmin меняется при любом UPDATE строки, поэтому в версию попадают
+    и изменения заказа, и изменения вложенных в ответ товаров. None — заказов нет.
+    """
+    signature = func.concat_ws(
+        ":", OrderModel.id, literal_column("orders.xmin"), OrderItemModel.id, literal_column("products.xmin")
+    )
+    stmt = (
+        select(func.md5(func.string_agg(signature, aggregate_order_by(literal_column("','"),
+                                                                      OrderModel.id, OrderItemModel.id))))
+        .select_from(OrderModel)
+        .outerjoin(OrderItemModel, OrderItemModel.order_id == OrderModel.id)
+        .outerjoin(ProductModel, ProductModel.id == OrderItemModel.product_id)
+        .where(OrderModel.user_id == user_id)
+    )
+    if order_id is not None:
+        stmt = stmt.where(OrderModel.id == order_id)
+
+    return await db.scalar(stmt)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.auth import hash_password, verify_password
+from app.config import (PASSWORD_EXECUTOR, PASSWORD_WORKERS, PASSWORD_MAX_PENDING,
+                        PASSWORD_RETRY_AFTER_SECONDS)
+
+
+def _timed(func, *args):
+    # Выполняется в воркере пула: возвращает результат и чистое время работы bcrypt
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class PasswordService:
+    """
+    Выносит хеширование и проверку паролей bcrypt из event loop в пул потоков или процессов.
+    Очередь ограничена max_pending: при переполнении сразу отвечаем 503 с Retry-After, а не копим задержку.
+    """
+
+    def __init__(self, kind: str, workers: int, max_pending: int, retry_after: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password executor: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._executor: Executor | None = None
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, try again later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, run_seconds = await loop.run_in_executor(self._get_executor(), _timed, func, *args)
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.run_seconds += run_seconds
+        self.wait_seconds += max(time.perf_counter() - started - run_seconds, 0.0)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """
+        Возвращает состояние очереди и среднее время ожидания/выполнения в миллисекундах.
+        """
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "max_pending_seen": self.max_pending_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "avg_run_ms": round(self.run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+
+password_service = PasswordService(
+    kind=PASSWORD_EXECUTOR,
+    workers=PASSWORD_WORKERS,
+    max_pending=PASSWORD_MAX_PENDING,
+    retry_after=PASSWORD_RETRY_AFTER_SECONDS,
+)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import SUGGEST_REBUILD_SECONDS
+from app.database.session import async_session_maker
+from app.models import Category as CategoryModel, Product as ProductModel
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.casefold().split())
+
+
+def _delete_entry(entries: list[tuple[str, int]], entry: tuple[str, int]) -> None:
+    position = bisect_left(entries, entry)
+    if position < len(entries) and entries[position] == entry:
+        del entries[position]
+
+
+class PrefixIndex:
+    """
+    Индекс автодополнения в памяти процесса: отсортированные массивы ключей и поиск префикса через bisect.
+    Ключи — название целиком и все его «хвосты» с начала каждого слова, чтобы «pro» находил «iPhone 15 Pro».
+    Названия целиком и хвосты лежат в разных массивах: совпадения с начала названия собираются первыми
+    и не вытесняются совпадениями в середине. Категории и товары тоже разделены, чтобы тысячи товаров
+    не вытесняли категории.
+    """
+
+    KINDS = ("category", "product")
+
+    def __init__(self, rebuild_seconds: float):
+        self.rebuild_seconds = rebuild_seconds
+        self._starts: dict[str, list[tuple[str, int]]] = {kind: [] for kind in self.KINDS}
+        self._tails: dict[str, list[tuple[str, int]]] = {kind: [] for kind in self.KINDS}
+        self._keys: dict[tuple[str, int], tuple[str, set[str]]] = {}
+        self._names: dict[tuple[str, int], str] = {}
+        self._built_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._rebuild_task: asyncio.Task | None = None
+        # Изменения, пришедшие во время фоновой перестройки: переносятся в новый индекс при подмене
+        self._pending: list[tuple[str, int, str | None]] | None = None
+
+    @staticmethod
+    def _make_keys(name: str) -> tuple[str, set[str]]:
+        words = _normalize(name).split(" ")
+        return " ".join(words), {" ".join(words[i:]) for i in range(1, len(words))}
+
+    def upsert(self, kind: str, item_id: int, name: str) -> None:
+        """
+        Добавляет или переименовывает запись. До первой загрузки индекса ничего не делает.
+        """
+        if self._built_at is None:
+            return
+        if self._pending is not None:
+            self._pending.append((kind, item_id, name))
+        self._apply(kind, item_id, name)
+
+    def remove(self, kind: str, item_id: int) -> None:
+        if self._pending is not None:
+            self._pending.append((kind, item_id, None))
+        self._apply(kind, item_id, None)
+
+    def _apply(self, kind: str, item_id: int, name: str | None) -> None:
+        keys = self._keys.pop((kind, item_id), None)
+        self._names.pop((kind, item_id), None)
+        if keys is not None:
+            start, tails = keys
+            _delete_entry(self._starts[kind], (start, item_id))
+            for tail in tails:
+                _delete_entry(self._tails[kind], (tail, item_id))
+
+        if name is None:
+            return
+        start, tails = self._make_keys(name)
+        insort(self._starts[kind], (start, item_id))
+        for tail in tails:
+            insort(self._tails[kind], (tail, item_id))
+        self._keys[(kind, item_id)] = (start, tails)
+        self._names[(kind, item_id)] = name
+
+    def search(self, prefix: str, limit: int) -> list[dict]:
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        found: dict[tuple[str, int], bool] = {}
+        for entries_by_kind, from_start in ((self._starts, True), (self._tails, False)):
+            # Совпадения с начала названия ранжируются выше, и если их хватает, хвосты не нужны
+            if not from_start and len(found) >= limit:
+                break
+            for kind, entries in entries_by_kind.items():
+                position = bisect_left(entries, (prefix,))
+                kind_found = 0
+                # Берём с запасом, чтобы после ранжирования осталось limit лучших
+                while position < len(entries) and kind_found < limit * 4:
+                    key, item_id = entries[position]
+                    if not key.startswith(prefix):
+                        break
+                    if (kind, item_id) not in found:
+                        found[(kind, item_id)] = from_start
+                        kind_found += 1
+                    position += 1
+
+        ranked = sorted(
+            found.items(),
+            key=lambda item: (not item[1], item[0][0] != "category", len(self._names[item[0]]), item[0][1]),
+        )
+        return [
+            {"type": kind, "id": item_id, "name": self._names[(kind, item_id)]}
+            for (kind, item_id), _ in ranked[:limit]
+        ]
+
+    @classmethod
+    def _build(cls, rows_by_kind: dict[str, list]) -> tuple:
+        starts = {kind: [] for kind in cls.KINDS}
+        tails = {kind: [] for kind in cls.KINDS}
+        keys = {}
+        names = {}
+        for kind, rows in rows_by_kind.items():
+            for item_id, name in rows:
+                start, item_tails = cls._make_keys(name)
+                starts[kind].append((start, item_id))
+                tails[kind].extend((tail, item_id) for tail in item_tails)
+                keys[(kind, item_id)] = (start, item_tails)
+                names[(kind, item_id)] = name
+        for kind in cls.KINDS:
+            starts[kind].sort()
+            tails[kind].sort()
+
+        return starts, tails, keys, names
+
+    async def _load(self, db_session: AsyncSession) -> tuple:
+        products = (await db_session.execute(
+            select(ProductModel.id, ProductModel.name).where(ProductModel.is_active == True)
+        )).all()
+        categories = (await db_session.execute(
+            select(CategoryModel.id, CategoryModel.name).where(CategoryModel.is_active == True)
+        )).all()
+
+        # Сортировка больших массивов не должна останавливать event loop, пока запросы обслуживает старый индекс
+        return await asyncio.to_thread(self._build, {"product": products, "category": categories})
+
+    def _swap(self, snapshot: tuple) -> None:
+        """
+        Подменяет массивы индекса целиком. Между подменой и переносом изменений нет await,
+        поэтому поиск не видит промежуточного состояния.
+        """
+        self._starts, self._tails, self._keys, self._names = snapshot
+        self._built_at = time.monotonic()
+        pending, self._pending = self._pending, None
+        for kind, item_id, name in pending or ():
+            self._apply(kind, item_id, name)
+
+    async def _rebuild(self) -> None:
+        try:
+            async with async_session_maker() as session:
+                snapshot = await self._load(session)
+            self._swap(snapshot)
+        except Exception:
+            logger.warning("Suggest index rebuild failed, serving the previous index", exc_info=True)
+        finally:
+            self._pending = None
+            self._rebuild_task = None
+
+    async def ensure_loaded(self, db_session: AsyncSession) -> None:
+        """
+        Строит индекс при первом обращении. Потом раз в rebuild_seconds перестраивает его целиком
+        фоновой задачей, а запросы тем временем обслуживает прежний индекс:
+        изменения из других воркеров сюда иначе не доходят.
+        """
+        if self._built_at is None:
+            async with self._lock:
+                if self._built_at is None:
+                    self._swap(await self._load(db_session))
+            return
+
+        if time.monotonic() - self._built_at >= self.rebuild_seconds and self._rebuild_task is None:
+            self._pending = []
+            self._rebuild_task = asyncio.create_task(self._rebuild())
+
+    async def stop(self) -> None:
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            try:
+                await self._rebuild_task
+            except asyncio.CancelledError:
+                pass
+
+
+suggest_index = PrefixIndex(rebuild_seconds=SUGGEST_REBUILD_SECONDS)
@@ -0,0 +1,90 @@
+"""
+Пропускная способность POST /orders/checkout, когда много покупателей одновременно оформляют
+один товар с ограниченным остатком.
+
+Заказы оформляются в отдельных сессиях, поэтому данные коммитятся и удаляются после замера.
+Бэкенд корзины берётся из CART_BACKEND:
+
+    python -m bench.checkout --buyers 200 --stock 50
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import text
+
+from app.auth import create_access_token
+from app.database.session import async_engine, async_session_maker
+from app.main import app
+from bench.timing import report, summarize
+
+
+async def seed(buyers: int, stock: int) -> tuple[int, int, list[tuple[int, str]]]:
+    async with async_session_maker() as db:
+        seller_id = await db.scalar(text("""
+            INSERT INTO users (email, hashed_password, role, is_active)
+            VALUES ('bench-checkout-seller@example.com', 'x', 'seller', true) RETURNING id
+        """))
+        category_id = await db.scalar(text(
+            "INSERT INTO categories (name, is_active) VALUES ('bench-checkout', true) RETURNING id"))
+        product_id = await db.scalar(text("""
+            INSERT INTO products (name, description, price, stock, is_active, category_id, seller_id)
+            VALUES ('bench checkout product', 'bench', 10, :stock, true, :category_id, :seller_id) RETURNING id
+        """), {"stock": stock, "category_id": category_id, "seller_id": seller_id})
+        users = (await db.execute(text("""
+            INSERT INTO users (email, hashed_password, role, is_active)
+            SELECT 'bench-checkout-' || g || '@example.com', 'x', 'buyer', true FROM generate_series(1, :buyers) g
+            RETURNING id, email
+        """), {"buyers": buyers})).all()
+        await db.execute(text("""
+            INSERT INTO cart_items (user_id, product_id, quantity)
+            SELECT id, :product_id, 1 FROM users WHERE email LIKE 'bench-checkout-%' AND role = 'buyer'
+        """), {"product_id": product_id})
+        await db.commit()
+
+    return product_id, category_id, users
+
+
+async def cleanup(product_id: int, category_id: int) -> None:
+    async with async_session_maker() as db:
+        await db.execute(text(
+            "DELETE FROM orders WHERE user_id IN (SELECT id FROM users WHERE email LIKE 'bench-checkout-%')"))
+        await db.execute(text("DELETE FROM products WHERE id = :id"), {"id": product_id})
+        await db.execute(text("DELETE FROM users WHERE email LIKE 'bench-checkout-%'"))
+        await db.execute(text("DELETE FROM categories WHERE id = :id"), {"id": category_id})
+        await db.commit()
+
+
+async def main(buyers: int, stock: int) -> None:
+    product_id, category_id, users = await seed(buyers, stock)
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                durations: dict[int, list[int]] = {}
+
+                async def checkout(user_id: int, email: str) -> None:
+                    token = create_access_token({"sub": email, "role": "buyer", "id": user_id})
+                    started = time.perf_counter_ns()
+                    response = await client.post("/orders/checkout", headers={"Authorization": f"Bearer {token}"})
+                    durations.setdefault(response.status_code, []).append(time.perf_counter_ns() - started)
+
+                started = time.perf_counter()
+                await asyncio.gather(*[checkout(user_id, email) for user_id, email in users])
+                elapsed = time.perf_counter() - started
+    finally:
+        await cleanup(product_id, category_id)
+        await async_engine.dispose()
+
+    report(f"POST /orders/checkout, {buyers} concurrent buyers, stock {stock}",
+           [(f"status {status_code}", summarize(samples)) for status_code, samples in sorted(durations.items())])
+    print(f"  {buyers / elapsed:.1f} checkouts/s, {elapsed:.2f} s total")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=200, help="одновременных покупателей")
+    parser.add_argument("--stock", type=int, default=50, help="остаток товара")
+    args = parser.parse_args()
+    asyncio.run(main(args.buyers, args.stock))
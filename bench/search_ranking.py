@@ -0,0 +1,72 @@
+"""
+Задержка GET /products/ для широкого и узкого полнотекстового запроса при rank_mode=full и bounded.
+
+Каталог засевается в транзакции и откатывается после замеров, база из DATABASE_URL не меняется:
+
+    python -m bench.search_ranking --products 200000 --repeat 30
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+from app.config import SEARCH_RANK_CANDIDATES
+from app.crud.products import get_products_pagination
+from app.database.session import async_engine, async_session_maker
+from bench.timing import measure_async, report
+
+# Широкое слово есть в 80% каталога, узкое — в 0.1%
+BROAD_QUERY = "benchbroad"
+NARROW_QUERY = "benchnarrow"
+
+
+async def seed_catalog(db_session, products: int) -> None:
+    category_id = await db_session.scalar(text(
+        "INSERT INTO categories (name, is_active) VALUES ('bench-category', true) RETURNING id"))
+    seller_id = await db_session.scalar(text("""
+        INSERT INTO users (email, hashed_password, role, is_active)
+        VALUES ('bench-seller@example.com', 'x', 'seller', true) RETURNING id
+    """))
+    await db_session.execute(text("""
+        INSERT INTO products (name, description, price, stock, is_active, category_id, seller_id)
+        SELECT 'bench product ' || g
+                   || CASE WHEN g % 5 <> 0 THEN ' benchbroad' ELSE '' END
+                   || CASE WHEN g % 1000 = 0 THEN ' benchnarrow' ELSE '' END,
+               'description ' || g || CASE WHEN g % 7 = 0 THEN ' benchbroad benchbroad' ELSE '' END,
+               (g % 5000) + 1, g % 50, true, :category_id, :seller_id
+        FROM generate_series(1, :products) g
+    """), {"products": products, "category_id": category_id, "seller_id": seller_id})
+    await db_session.execute(text("SELECT gin_clean_pending_list('ix_products_tsv_gin'::regclass)"))
+    await db_session.execute(text("ANALYZE products"))
+
+
+async def main(products: int, repeat: int) -> None:
+    async with async_session_maker() as session:
+        await seed_catalog(session, products)
+
+        rows = []
+        for name, query in (("broad", BROAD_QUERY), ("narrow", NARROW_QUERY)):
+            for rank_mode in ("full", "bounded"):
+                result = {}
+
+                async def listing():
+                    result.update(await get_products_pagination(session, page=1, page_size=20, search=query,
+                                                                search_mode="fulltext", rank_mode=rank_mode))
+
+                stats = await measure_async(listing, repeat=repeat, warmup=3)
+                total = f"{result['total']}{'+' if result['total_is_lower_bound'] else ''}"
+                rows.append((f"{name} {rank_mode} (total {total})", stats))
+
+        await session.rollback()
+    await async_engine.dispose()
+
+    report(f"GET /products/?search=... page 1, {products} products, SEARCH_RANK_CANDIDATES={SEARCH_RANK_CANDIDATES}",
+           rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200000, help="сколько товаров засеять")
+    parser.add_argument("--repeat", type=int, default=30, help="замеров на каждый случай")
+    args = parser.parse_args()
+    asyncio.run(main(args.products, args.repeat))
@@ -0,0 +1,97 @@
+"""
+Накладные расходы на вызов горячих crud-запросов: select(), собираемый заново на каждый вызов
+(как было до lambda_stmt), против lambda_stmt из app/crud.
+
+Python-часть — построение выражения и его ключа кеша, то, что SQLAlchemy делает при каждом execute
+до поиска готового SQL в кеше компиляции. Полный вызов с походом в базу из DATABASE_URL
+только читает данные:
+
+    python -m bench.statements --repeat 5000
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import lambda_stmt, select
+
+from app.crud import get_product_by_id, get_user_by_email
+from app.database.session import async_engine, async_session_maker
+from app.models import Product as ProductModel, User as UserModel
+from bench.timing import measure, measure_async, report
+
+
+def select_product(product_id: int):
+    return select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
+
+
+def lambda_product(product_id: int):
+    return lambda_stmt(lambda: select(ProductModel).where(ProductModel.id == product_id,
+                                                          ProductModel.is_active == True))
+
+
+def select_user(email: str, is_active: bool):
+    return select(UserModel).where(UserModel.email == email, UserModel.is_active == is_active)
+
+
+def lambda_user(email: str, is_active: bool):
+    user_stmt = lambda_stmt(lambda: select(UserModel).where(UserModel.email == email))
+    user_stmt += lambda s: s.where(UserModel.is_active == is_active)
+    return user_stmt
+
+
+def measure_construction(repeat: int) -> list[tuple[str, dict]]:
+    return [
+        ("product by id, select()", measure(lambda: select_product(42)._generate_cache_key(), repeat)),
+        ("product by id, lambda_stmt", measure(lambda: lambda_product(42)._generate_cache_key(), repeat)),
+        ("user by email, select()", measure(lambda: select_user("a@b.c", True)._generate_cache_key(), repeat)),
+        ("user by email, lambda_stmt", measure(lambda: lambda_user("a@b.c", True)._generate_cache_key(), repeat)),
+    ]
+
+
+async def measure_execution(repeat: int) -> list[tuple[str, dict]]:
+    async with async_session_maker() as session:
+        product_id = await session.scalar(select(ProductModel.id).where(ProductModel.is_active == True).limit(1))
+        email = await session.scalar(select(UserModel.email).where(UserModel.is_active == True).limit(1))
+        if product_id is None or email is None:
+            return []
+
+        async def product_select():
+            (await session.scalars(select_product(product_id))).first()
+            session.expunge_all()
+
+        async def product_lambda():
+            await get_product_by_id(session, product_id)
+            session.expunge_all()
+
+        async def user_select():
+            (await session.scalars(select_user(email, True))).first()
+            session.expunge_all()
+
+        async def user_lambda():
+            await get_user_by_email(session, email, is_active=True)
+            session.expunge_all()
+
+        rows = [
+            ("product by id, select()", await measure_async(product_select, repeat)),
+            ("product by id, lambda_stmt", await measure_async(product_lambda, repeat)),
+            ("user by email, select()", await measure_async(user_select, repeat)),
+            ("user by email, lambda_stmt", await measure_async(user_lambda, repeat)),
+        ]
+    await async_engine.dispose()
+
+    return rows
+
+
+def main(repeat: int) -> None:
+    report("Statement construction + cache key", measure_construction(repeat))
+    rows = asyncio.run(measure_execution(repeat))
+    if rows:
+        report("Full call against the database", rows)
+    else:
+        print("Full call against the database: skipped, no active product or user")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5000, help="замеров на каждый случай")
+    args = parser.parse_args()
+    main(args.repeat)
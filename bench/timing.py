@@ -0,0 +1,49 @@
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+
+def summarize(samples_ns: list[int]) -> dict:
+    """
+    Сводка по замерам в микросекундах: среднее, медиана и 95-й перцентиль.
+    """
+    samples = sorted(sample / 1000 for sample in samples_ns)
+    return {
+        "n": len(samples),
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p95_us": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def measure(func: Callable[[], object], repeat: int, warmup: int = 100) -> dict:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - started)
+
+    return summarize(samples)
+
+
+async def measure_async(func: Callable[[], Awaitable[object]], repeat: int, warmup: int = 10) -> dict:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        await func()
+        samples.append(time.perf_counter_ns() - started)
+
+    return summarize(samples)
+
+
+def report(title: str, rows: list[tuple[str, dict]]) -> None:
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    print(f"  {'case'.ljust(width)}  {'n':>6}  {'mean, us':>10}  {'p50, us':>10}  {'p95, us':>10}")
+    for name, stats in rows:
+        print(f"  {name.ljust(width)}  {stats['n']:>6}  {stats['mean_us']:>10.1f}  "
+              f"{stats['p50_us']:>10.1f}  {stats['p95_us']:>10.1f}")
@@ -0,0 +1,64 @@
+"""
+Сколько экономит кеш проверенных JWT на одном запросе.
+
+Замеры идут в одном процессе — так же, как в каждом воркере gunicorn из docker-compose.prod.yaml
+(uvicorn.workers.UvicornWorker): кеш у воркера свой, и повторные запросы с тем же токеном
+попадают в него. Запросов к базе нет: пользователь подкладывается в principal_cache:
+
+    python -m bench.token_cache --repeat 5000
+"""
+import argparse
+import asyncio
+
+import httpx
+import jwt
+
+from app.auth import Principal, create_access_token, decode_token, principal_cache, token_cache
+from app.config import JWT_ALGORITHM, JWT_SECRET_KEY
+from app.main import app
+from bench.timing import measure, measure_async, report
+
+EMAIL = "bench-user@example.com"
+
+
+async def measure_requests(token: str, repeat: int) -> list[tuple[str, dict]]:
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def cold_request():
+            token_cache.clear()
+            response = await client.get("/users/me", headers=headers)
+            response.raise_for_status()
+
+        async def warm_request():
+            response = await client.get("/users/me", headers=headers)
+            response.raise_for_status()
+
+        return [
+            ("GET /users/me, token cache cold", await measure_async(cold_request, repeat)),
+            ("GET /users/me, token cache warm", await measure_async(warm_request, repeat)),
+        ]
+
+
+def main(repeat: int) -> None:
+    token = create_access_token({"sub": EMAIL, "role": "buyer", "id": 1})
+    principal_cache.set(EMAIL, Principal(id=1, email=EMAIL, role="buyer"))
+
+    def uncached_decode():
+        jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+
+    def cached_decode():
+        decode_token(token)
+
+    report(f"JWT verification ({JWT_ALGORITHM})", [
+        ("jwt.decode", measure(uncached_decode, repeat)),
+        ("decode_token, cache hit", measure(cached_decode, repeat)),
+    ])
+    report("Per request through the ASGI app", asyncio.run(measure_requests(token, repeat)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5000, help="замеров на каждый случай")
+    args = parser.parse_args()
+    main(args.repeat)
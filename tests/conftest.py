@@ -0,0 +1,47 @@
+import os
+
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+# Тесты с базой берут её из DATABASE_URL и без неё пропускаются
+DATABASE_CONFIGURED = bool(os.getenv("DATABASE_URL"))
+
+# Обязательные настройки app.config. Без базы модули приложения всё равно должны импортироваться:
+# движок не подключается до первого запроса
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/test")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_engine():
+    """
+    Движок приложения; пул закрывается после теста, потому что соединения asyncpg привязаны к event loop.
+    """
+    if not DATABASE_CONFIGURED:
+        pytest.skip("DATABASE_URL is not set")
+
+    from app.database.session import async_engine
+
+    yield async_engine
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def db_session(db_engine):
+    """
+    Сессия, все изменения которой откатываются после теста.
+    """
+    from app.database.session import async_session_maker
+
+    async with async_session_maker() as session:
+        yield session
+        await session.rollback()
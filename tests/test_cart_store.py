@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, func, select, text
+
+from app.models.cart_items import CartItem as CartItemModel
+from app.services.cart_store import MemoryCartStore, RedisCartStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store():
+    return MemoryCartStore(flush_seconds=60, flush_batch_size=100)
+
+
+@pytest.fixture
+async def buyer(db_engine):
+    """
+    Покупатель и товар, закоммиченные в базу: фоновая запись корзин работает в своей сессии.
+    """
+    from app.database.session import async_session_maker
+
+    async with async_session_maker() as db:
+        product_id = await db.scalar(text("SELECT id FROM products WHERE is_active LIMIT 1"))
+        if product_id is None:
+            pytest.skip("no active products in the database")
+        user_id = await db.scalar(text("""
+            INSERT INTO users (email, hashed_password, role, is_active)
+            VALUES ('cart-store-buyer@example.com', 'x', 'buyer', true) RETURNING id
+        """))
+        await db.commit()
+
+    yield user_id, product_id
+
+    async with async_session_maker() as db:
+        await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        await db.execute(text("DELETE FROM users WHERE id = :id"), {"id": user_id})
+        await db.commit()
+
+
+async def test_waiting_flush_does_not_resurrect_checked_out_cart(store, buyer):
+    from app.database.session import async_session_maker
+
+    user_id, product_id = buyer
+    async with async_session_maker() as db:
+        await store.add_item(db, user_id, product_id, 2)
+
+        # Оформление заказа: корзина записана и заблокирована до commit
+        await store.flush_user(db, user_id)
+        flush = asyncio.create_task(store.flush_dirty())
+        await asyncio.sleep(0.2)
+        assert not flush.done(), "background flush must wait for the checkout lock"
+
+        await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        await store.detach(user_id)
+        await db.commit()
+
+    assert await flush == 1
+    async with async_session_maker() as db:
+        rows = await db.scalar(select(func.count()).select_from(CartItemModel).where(CartItemModel.user_id == user_id))
+    assert rows == 0
+    assert await store._read(user_id) == {}
+    assert await store.flush_dirty() == 0
+
+
+async def test_restore_returns_detached_cart(store):
+    store._carts[1] = {10: 2}
+    store._dirty.add(1)
+
+    detached = await store.detach(1)
+    assert await store._read(1) == {}
+    assert 1 not in store._dirty
+
+    # Заказ не зафиксировался: корзина возвращается и снова будет записана в базу
+    await store.restore(1, detached)
+    assert await store._read(1) == {10: 2}
+    assert 1 in store._dirty
+
+    detached = await store.detach(2)
+    await store.restore(2, detached)
+    assert await store._read(2) is None
+
+
+async def test_redis_cart_expired_after_load_is_reloaded(db_session):
+    pytest.importorskip("fakeredis")
+    product_ids = list(await db_session.scalars(text("SELECT id FROM products WHERE is_active ORDER BY id LIMIT 3")))
+    if len(product_ids) < 3:
+        pytest.skip("not enough active products in the database")
+    user_id = await db_session.scalar(text("""
+        INSERT INTO users (email, hashed_password, role, is_active)
+        VALUES ('cart-store-redis@example.com', 'x', 'buyer', true) RETURNING id
+    """))
+    await db_session.execute(text("""
+        INSERT INTO cart_items (user_id, product_id, quantity) VALUES (:user_id, :first, 2), (:user_id, :second, 1)
+    """), {"user_id": user_id, "first": product_ids[0], "second": product_ids[1]})
+
+    store = RedisCartStore(url="fakeredis://", ttl_seconds=60, flush_seconds=60, flush_batch_size=100)
+    ensure_loaded = store._ensure_loaded
+    loads = []
+
+    async def expire_after_first_load(db, user_id):
+        items = await ensure_loaded(db, user_id)
+        if not loads:
+            # TTL истёк между загрузкой корзины и записью позиции
+            await store._redis.delete(store._key(user_id))
+        loads.append(items)
+        return items
+
+    store._ensure_loaded = expire_after_first_load
+    try:
+        await store.add_item(db_session, user_id, product_ids[2], 1)
+        assert len(loads) == 2
+        assert await store._read(user_id) == {product_ids[0]: 2, product_ids[1]: 1, product_ids[2]: 1}
+    finally:
+        await store._redis.aclose()
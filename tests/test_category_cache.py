@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy import text
+
+from app.services.categories import CategoryCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_category_created_after_snapshot_exists(db_session):
+    cache = CategoryCache(ttl=60)
+    await cache.get_all()
+
+    # Категорию создал другой воркер: его invalidate() до этого снимка не доходит
+    category_id = await db_session.scalar(text(
+        "INSERT INTO categories (name, is_active) VALUES ('cache-late-category', true) RETURNING id"))
+
+    assert await cache.exists(db_session, category_id)
+    assert (await cache.get(db_session, category_id)).name == "cache-late-category"
+    assert not await cache.exists(db_session, category_id + 1000)
+
+
+async def test_snapshot_is_loaded_from_primary(db_session):
+    category_id = await db_session.scalar(text("SELECT id FROM categories WHERE is_active LIMIT 1"))
+    if category_id is None:
+        pytest.skip("no active categories in the database")
+
+    cache = CategoryCache(ttl=60)
+    # Сессия запроса (например, с реплики) для загрузки снимка не используется
+    replica_session = object()
+    assert await cache.exists(replica_session, category_id)
+    assert cache._loaded_version == cache.version
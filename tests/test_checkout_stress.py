@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app.auth import create_access_token
+
+pytestmark = pytest.mark.anyio
+
+# Покупателей больше, чем единиц товара: успешных заказов должно быть ровно STOCK
+BUYERS = 40
+STOCK = 10
+
+
+@pytest.fixture
+async def contested_product(db_engine):
+    """
+    Товар с ограниченным остатком и покупатели, у каждого из которых он лежит в корзине.
+    Данные коммитятся: каждый checkout идёт в своей сессии. После теста всё удаляется.
+    """
+    from app.database.session import async_session_maker
+
+    async with async_session_maker() as db:
+        seller_id = await db.scalar(text("""
+            INSERT INTO users (email, hashed_password, role, is_active)
+            VALUES ('stress-seller@example.com', 'x', 'seller', true) RETURNING id
+        """))
+        category_id = await db.scalar(text(
+            "INSERT INTO categories (name, is_active) VALUES ('stress-category', true) RETURNING id"))
+        product_id = await db.scalar(text("""
+            INSERT INTO products (name, description, price, stock, is_active, category_id, seller_id)
+            VALUES ('stress product', 'stress', 10, :stock, true, :category_id, :seller_id) RETURNING id
+        """), {"stock": STOCK, "category_id": category_id, "seller_id": seller_id})
+        buyers = (await db.execute(text("""
+            INSERT INTO users (email, hashed_password, role, is_active)
+            SELECT 'stress-buyer-' || g || '@example.com', 'x', 'buyer', true FROM generate_series(1, :buyers) g
+            RETURNING id, email
+        """), {"buyers": BUYERS})).all()
+        await db.execute(text("""
+            INSERT INTO cart_items (user_id, product_id, quantity)
+            SELECT id, :product_id, 1 FROM users WHERE email LIKE 'stress-buyer-%'
+        """), {"product_id": product_id})
+        await db.commit()
+
+    yield product_id, buyers
+
+    async with async_session_maker() as db:
+        await db.execute(text("DELETE FROM orders WHERE user_id IN (SELECT id FROM users WHERE email LIKE 'stress-%')"))
+        await db.execute(text("DELETE FROM products WHERE id = :id"), {"id": product_id})
+        await db.execute(text("DELETE FROM users WHERE email LIKE 'stress-%'"))
+        await db.execute(text("DELETE FROM categories WHERE id = :id"), {"id": category_id})
+        await db.commit()
+
+
+async def test_concurrent_checkouts_never_oversell(contested_product):
+    from app.database.session import async_session_maker
+    from app.main import app
+
+    product_id, buyers = contested_product
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async def checkout(user_id: int, email: str) -> httpx.Response:
+                token = create_access_token({"sub": email, "role": "buyer", "id": user_id})
+                return await client.post("/orders/checkout", headers={"Authorization": f"Bearer {token}"})
+
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[checkout(user_id, email) for user_id, email in buyers])
+            elapsed = time.perf_counter() - started
+
+    statuses = [response.status_code for response in responses]
+    # Пропускная способность — в bench/checkout.py; здесь она только поясняет падение
+    throughput = f"{len(responses)} checkouts in {elapsed:.2f}s ({len(responses) / elapsed:.1f}/s)"
+
+    assert statuses.count(201) == STOCK, f"{statuses.count(201)} created, {throughput}"
+    assert set(statuses) <= {201, 400, 409}, [response.json() for response in responses]
+
+    async with async_session_maker() as db:
+        stock = await db.scalar(text("SELECT stock FROM products WHERE id = :id"), {"id": product_id})
+        ordered = await db.scalar(text("SELECT coalesce(sum(quantity), 0) FROM order_items WHERE product_id = :id"),
+                                  {"id": product_id})
+    assert stock == 0
+    assert ordered == STOCK
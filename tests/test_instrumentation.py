@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import DATABASE_URL
+from app.database.instrumentation import RequestStats, _request_stats, instrument_engine
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_statement_leaves_no_timing_on_pooled_connection(db_engine):
+    engine = create_async_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    instrument_engine(engine)
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        async with engine.connect() as conn:
+            with pytest.raises(DBAPIError):
+                await conn.execute(text("SELECT 1 / 0"))
+            await conn.rollback()
+            await conn.execute(text("SELECT pg_sleep(0.05)"))
+            info = (await conn.get_raw_connection()).info
+    finally:
+        _request_stats.reset(token)
+        await engine.dispose()
+
+    assert not info.get("query_started")
+    assert stats.count == 1
+    assert 0.05 <= stats.db_seconds < 1
@@ -0,0 +1,172 @@
+"""
+Регрессия планов выдачи каталога: каждое сочетание фильтров и сортировки GET /products/ прогоняется
+через EXPLAIN на засеянной базе, и тест падает, если по products пошёл Seq Scan.
+Данные засеваются в транзакции теста и откатываются вместе с ней.
+"""
+import json
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+
+from app.crud.products import get_products_pagination
+
+pytestmark = pytest.mark.anyio
+
+SEED_PRODUCTS = 200000
+SEED_CATEGORIES = 100
+SEED_SELLERS = 200
+
+FILTERS = {
+    "all": lambda seed: {},
+    "category": lambda seed: {"category_id": seed["category_id"]},
+    "category_tree": lambda seed: {"category_id": seed["root_category_id"], "include_descendants": True},
+    "seller": lambda seed: {"seller_id": seed["seller_id"]},
+    "price_range": lambda seed: {"min_price": 100, "max_price": 150},
+    "in_stock": lambda seed: {"in_stock": True},
+    "out_of_stock": lambda seed: {"in_stock": False},
+    "category_price": lambda seed: {"category_id": seed["category_id"], "min_price": 100, "max_price": 2000},
+    "search": lambda seed: {"search": "seedword3", "search_mode": "fulltext"},
+}
+SORTS = [None, "price_asc", "price_desc", "rating", "newest"]
+
+
+async def _seed_catalog(db_session) -> dict:
+    # Не даём автовакууму пересчитать статистику таблиц, пока тест работает с засеянными строками
+    await db_session.execute(text(
+        "LOCK TABLE products, categories, category_closure IN SHARE UPDATE EXCLUSIVE MODE"))
+    # Стоимость случайного чтения как у SSD в продакшене; умолчание 4.0 рассчитано на HDD
+    await db_session.execute(text("SET LOCAL random_page_cost = 1.1"))
+    sellers = (await db_session.scalars(text("""
+        INSERT INTO users (email, hashed_password, role, is_active)
+        SELECT 'plan-seller-' || g || '@example.com', 'x', 'seller', true FROM generate_series(1, :n) g
+        RETURNING id
+    """), {"n": SEED_SELLERS})).all()
+    root_category_id = await db_session.scalar(text(
+        "INSERT INTO categories (name, is_active) VALUES ('plan-root', true) RETURNING id"))
+    categories = (await db_session.scalars(text("""
+        INSERT INTO categories (name, parent_id, is_active)
+        SELECT 'plan-category-' || g, CASE WHEN g <= 2 THEN CAST(:root AS integer) END, true
+        FROM generate_series(1, :n) g
+        RETURNING id
+    """), {"root": root_category_id, "n": SEED_CATEGORIES})).all()
+    await db_session.execute(text("""
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT id, id, 0 FROM categories WHERE id = :root OR id = ANY(CAST(:categories AS integer[]))
+        UNION ALL
+        SELECT :root, id, 1 FROM categories WHERE parent_id = :root
+    """), {"root": root_category_id, "categories": list(categories)})
+
+    await db_session.execute(text("""
+        INSERT INTO products (name, description, price, stock, is_active, category_id, seller_id, rating)
+        SELECT 'seeded product ' || g || ' seedword' || (g % 50),
+               'seeded description ' || g,
+               (g * 7919 % 500000) / 100.0,
+               CASE WHEN g % 11 = 0 THEN 0 ELSE g % 100 END,
+               g % 23 <> 0,
+               (CAST(:categories AS integer[]))[1 + g % :category_count],
+               (CAST(:sellers AS integer[]))[1 + g % :seller_count],
+               (g * 31 % 50) / 10.0
+        FROM generate_series(1, :n) g
+    """), {"categories": list(categories), "category_count": len(categories), "sellers": list(sellers),
+          "seller_count": len(sellers), "n": SEED_PRODUCTS})
+    # Свежие строки лежат в pending list GIN-индекса, и планировщик считает его скан дорогим
+    await db_session.execute(text("SELECT gin_clean_pending_list('ix_products_tsv_gin'::regclass)"))
+    await db_session.execute(text("ANALYZE products, categories, category_closure"))
+
+    return {"root_category_id": root_category_id, "category_id": categories[0], "seller_id": sellers[0]}
+
+
+def _product_scans(plan: dict) -> list[dict]:
+    found = []
+    if plan.get("Relation Name") == "products":
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(_product_scans(child))
+
+    return found
+
+
+@contextmanager
+def _captured_statements(engine):
+    """
+    Собирает SQL, который выдача отправляет в базу, вместе с параметрами драйвера.
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("EXPLAIN"):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield captured
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+async def _explain(db_session, statement: str, parameters) -> dict:
+    connection = await db_session.connection()
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]["Plan"]
+
+
+async def test_listing_queries_use_indexes(db_session, db_engine):
+    seed = await _seed_catalog(db_session)
+
+    failures = []
+    with _captured_statements(db_engine) as captured:
+        for filter_name, make_filters in FILTERS.items():
+            for sort in SORTS:
+                params = make_filters(seed)
+                captured.clear()
+                # count_strategy=estimated: точный счёт по широкому фильтру законно читает всю выборку
+                first_page = await get_products_pagination(db_session, page=1, page_size=20, sort=sort,
+                                                           count_strategy="estimated", **params)
+                if first_page["next_cursor"]:
+                    await get_products_pagination(db_session, page=1, page_size=20, sort=sort,
+                                                  cursor=first_page["next_cursor"], count_strategy="estimated",
+                                                  **params)
+                await get_products_pagination(db_session, page=20, page_size=20, sort=sort,
+                                              count_strategy="estimated", **params)
+
+                for statement, parameters in list(captured):
+                    for scan in _product_scans(await _explain(db_session, statement, parameters)):
+                        if scan["Node Type"] == "Seq Scan":
+                            failures.append(f"{filter_name}/{sort or 'default'}: Seq Scan on products "
+                                            f"({scan.get('Filter', 'no filter')})")
+
+    assert not failures, "\n".join(failures)
+
+
+async def test_cursor_pages_seek_into_index(db_session, db_engine):
+    """
+    Условие курсора должно стать границей скана индекса, а не фильтром поверх скана с начала:
+    иначе глубокие страницы дорожают с каждой следующей.
+    """
+    seed = await _seed_catalog(db_session)
+
+    failures = []
+    # Составные индексы под сортировку есть для всего каталога и для категории
+    for filter_name in ("all", "category"):
+        for sort in ("price_asc", "price_desc", "rating"):
+            params = FILTERS[filter_name](seed)
+            first_page = await get_products_pagination(db_session, page=1, page_size=20, sort=sort,
+                                                       count_strategy="estimated", **params)
+            assert first_page["next_cursor"], f"{filter_name}/{sort}: seeded data has a single page"
+
+            with _captured_statements(db_engine) as captured:
+                await get_products_pagination(db_session, page=1, page_size=20, sort=sort,
+                                              cursor=first_page["next_cursor"], count_strategy="estimated",
+                                              **params)
+
+            statement, parameters = captured[0]
+            for scan in _product_scans(await _explain(db_session, statement, parameters)):
+                if "ROW(" not in scan.get("Index Cond", ""):
+                    failures.append(f"{filter_name}/{sort}: {scan['Node Type']} without a keyset bound "
+                                    f"(Index Cond: {scan.get('Index Cond')}, Filter: {scan.get('Filter')})")
+
+    assert not failures, "\n".join(failures)
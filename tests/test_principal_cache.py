@@ -0,0 +1,30 @@
+import dataclasses
+
+import pytest
+from sqlalchemy import text
+
+from app.auth import Principal, create_access_token, get_current_user, principal_cache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cached_principal_is_immutable_and_detached_from_orm(db_session):
+    email = "principal-cache@example.com"
+    user_id = await db_session.scalar(text("""
+        INSERT INTO users (email, hashed_password, role, is_active)
+        VALUES (:email, 'secret-hash', 'buyer', true) RETURNING id
+    """), {"email": email})
+    token = create_access_token({"sub": email, "role": "buyer", "id": user_id})
+    principal_cache.pop(email)
+
+    try:
+        first = await get_current_user(token=token, db=db_session)
+        second = await get_current_user(token=token, db=db_session)
+    finally:
+        principal_cache.pop(email)
+
+    assert first == Principal(id=user_id, email=email, role="buyer", is_active=True)
+    assert second is first
+    assert not hasattr(first, "hashed_password")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first.role = "admin"
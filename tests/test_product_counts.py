@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import text
+
+from app.crud.products import _products_cache, get_products_pagination
+from app.services.categories import move_category_in_hierarchy
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("search_mode", ["fulltext", "fuzzy"])
+@pytest.mark.parametrize("search", ["usb :c", "100% cotton", "50%:off 'x'"])
+async def test_estimated_count_with_special_characters(db_session, search, search_mode):
+    if search_mode == "fuzzy" and not await db_session.scalar(
+            text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")):
+        pytest.skip("pg_trgm is not installed")
+
+    result = await get_products_pagination(db_session, page=1, page_size=5, search=search,
+                                           search_mode=search_mode, count_strategy="estimated",
+                                           min_price=1, in_stock=True)
+
+    assert result["count_strategy"] == "estimated"
+    assert result["search_mode"] == search_mode
+    assert isinstance(result["total"], int) and result["total"] >= 0
+
+
+async def test_moving_category_invalidates_counts_after_commit(db_session):
+    root_id = await db_session.scalar(text(
+        "SELECT id FROM categories WHERE is_active AND parent_id IS NULL ORDER BY id LIMIT 1"))
+    if root_id is None:
+        pytest.skip("no active categories in the database")
+
+    _products_cache.set("cached-count", 42)
+    # Корневая категория переносится в корень: замыкание не меняется, а кеш сбрасывается по самому вызову
+    await move_category_in_hierarchy(db_session, category_id=root_id, parent_id=None)
+    assert _products_cache.get("cached-count") == 42, "must not be cleared before commit"
+
+    await db_session.rollback()
+    await db_session.commit()
+    assert _products_cache.get("cached-count") == 42, "rolled back move must not clear the cache"
+
+    await move_category_in_hierarchy(db_session, category_id=root_id, parent_id=None)
+    await db_session.commit()
+    assert _products_cache.get("cached-count") is None
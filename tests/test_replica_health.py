@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.database.session import ReplicaHealth
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    monkeypatch.setattr("app.database.session.async_read_session_maker", object())
+    return ReplicaHealth(max_lag_seconds=5, check_seconds=10, check_timeout_seconds=0.1)
+
+
+async def test_unreachable_replica_does_not_block_reads(replica, monkeypatch):
+    async def hanging_connect():
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(replica, "_fetch_lag", hanging_connect)
+
+    # Запросы не ждут проверку и до её окончания читают из основной базы
+    results = await asyncio.wait_for(asyncio.gather(*[replica.is_usable() for _ in range(10)]), timeout=0.05)
+    assert results == [False] * 10
+
+    await asyncio.sleep(0.2)
+    assert replica.stats()["healthy"] is False
+    assert replica._check_task is None
+    assert await replica.is_usable() is False
+    assert replica._check_task is None, "a failed check is not retried before check_seconds"
+
+
+async def test_last_known_state_is_used_while_rechecking(replica, monkeypatch):
+    lags = [0.5, 30.0]
+
+    async def fetch_lag():
+        await asyncio.sleep(0.01)
+        return lags.pop(0)
+
+    monkeypatch.setattr(replica, "_fetch_lag", fetch_lag)
+
+    assert await replica.is_usable() is False
+    await asyncio.sleep(0.05)
+    assert await replica.is_usable() is True
+
+    # Проверка устарела: пока новая идёт, используется прежний результат
+    replica._checked_at -= 60
+    assert await replica.is_usable() is True
+    await asyncio.sleep(0.05)
+    assert await replica.is_usable() is False
+    assert replica.lag_seconds == 30.0
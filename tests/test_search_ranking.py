@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import text
+
+from app.crud.products import get_products_pagination
+
+pytestmark = pytest.mark.anyio
+
+CANDIDATES = 50
+
+
+async def _seed_matches(db_session) -> dict[str, list[int]]:
+    """
+    Засевает товары под широкий запрос (больше CANDIDATES совпадений) и узкий (меньше).
+    Слово в названии весит больше, чем в описании, поэтому ранги совпадений различаются.
+    """
+    category_id = await db_session.scalar(text(
+        "INSERT INTO categories (name, is_active) VALUES ('rank-category', true) RETURNING id"))
+    seller_id = await db_session.scalar(text("""
+        INSERT INTO users (email, hashed_password, role, is_active)
+        VALUES ('rank-seller@example.com', 'x', 'seller', true) RETURNING id
+    """))
+    ids = {}
+    for word, count in (("rankbroad", CANDIDATES * 4), ("ranknarrow", CANDIDATES // 5)):
+        ids[word] = (await db_session.scalars(text("""
+            INSERT INTO products (name, description, price, stock, is_active, category_id, seller_id)
+            SELECT CASE WHEN g % 3 = 0 THEN :word || ' item ' || g ELSE 'item ' || g END,
+                   CASE WHEN g % 3 = 0 THEN 'plain' ELSE :word || ' in description' END,
+                   10, 1, true, :category_id, :seller_id
+            FROM generate_series(1, :count) g
+            RETURNING id
+        """), {"word": word, "count": count, "category_id": category_id, "seller_id": seller_id})).all()
+
+    return ids
+
+
+async def _walk(db_session, search: str, rank_mode: str) -> tuple[list, list[int]]:
+    pages = []
+    cursor = None
+    while True:
+        page = await get_products_pagination(db_session, page=1, page_size=7, search=search,
+                                             search_mode="fulltext", rank_mode=rank_mode, cursor=cursor)
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages, [item.id for page in pages for item in page["items"]]
+
+
+async def test_bounded_ranking_ranks_only_newest_candidates(db_session, monkeypatch):
+    monkeypatch.setattr("app.crud.products.SEARCH_RANK_CANDIDATES", CANDIDATES)
+    ids = await _seed_matches(db_session)
+
+    first = await get_products_pagination(db_session, page=1, page_size=10, search="rankbroad",
+                                          search_mode="fulltext", rank_mode="bounded")
+    assert first["total"] == CANDIDATES
+    assert first["total_is_lower_bound"] is True
+
+    _, walked = await _walk(db_session, "rankbroad", "bounded")
+    newest = sorted(ids["rankbroad"], reverse=True)[:CANDIDATES]
+    assert sorted(walked) == sorted(newest)
+
+    # Внутри кандидатов порядок тот же, что у полного ранжирования: совпадения в названии выше
+    _, full = await _walk(db_session, "rankbroad", "full")
+    assert walked == [product_id for product_id in full if product_id in set(newest)]
+
+
+async def test_bounded_ranking_matches_full_for_narrow_queries(db_session, monkeypatch):
+    monkeypatch.setattr("app.crud.products.SEARCH_RANK_CANDIDATES", CANDIDATES)
+    ids = await _seed_matches(db_session)
+
+    bounded_pages, bounded = await _walk(db_session, "ranknarrow", "bounded")
+    full_pages, full = await _walk(db_session, "ranknarrow", "full")
+
+    assert bounded == full
+    assert sorted(full) == sorted(ids["ranknarrow"])
+    assert bounded_pages[0]["total"] == full_pages[0]["total"] == len(ids["ranknarrow"])
+    assert bounded_pages[0]["total_is_lower_bound"] is False
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, text
+
+from app.database.slow_queries import SlowQueryLog, _is_explainable
+from app.services.cart import set_cart_item_quantity, upsert_cart_item
+
+
+@pytest.mark.parametrize("statement", [
+    "SELECT products.id FROM products WHERE products.is_active = true",
+    "WITH tree AS (SELECT id FROM categories) SELECT * FROM tree",
+    "SELECT products.updated_at, products.deleted_flag FROM products",
+])
+def test_plain_selects_are_explainable(statement):
+    assert _is_explainable(statement)
+
+
+@pytest.mark.parametrize("statement", [
+    "WITH updated AS \n(UPDATE cart_items SET quantity=$1 RETURNING cart_items.id) SELECT * FROM updated",
+    "WITH gone AS (DELETE FROM cart_items RETURNING id) SELECT count(*) FROM gone",
+    "WITH new AS (INSERT INTO orders (user_id) VALUES ($1) RETURNING id) SELECT id FROM new",
+    "SELECT products.id FROM products WHERE products.id IN ($1) FOR UPDATE",
+    "SELECT products.id FROM products FOR NO KEY UPDATE",
+    "SELECT products.id FROM products FOR KEY SHARE",
+    "SELECT pg_advisory_xact_lock($1, $2)",
+    "SELECT nextval('orders_id_seq')",
+    "UPDATE products SET stock = stock - 1",
+])
+def test_side_effects_are_not_explainable(statement):
+    assert not _is_explainable(statement)
+
+
+@pytest.mark.anyio
+async def test_cart_write_statements_are_not_explainable(db_session, db_engine):
+    user_id = await db_session.scalar(text("""
+        INSERT INTO users (email, hashed_password, role, is_active)
+        VALUES ('slow-query-buyer@example.com', 'x', 'buyer', true) RETURNING id
+    """))
+    product_id = await db_session.scalar(text("SELECT id FROM products WHERE is_active LIMIT 1"))
+    if product_id is None:
+        pytest.skip("no active products in the database")
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await upsert_cart_item(db_session, user_id, product_id, 1)
+        await set_cart_item_quantity(db_session, user_id, product_id, 3)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    writes = [statement for statement in captured if "cart_items" in statement]
+    assert len(writes) == 2
+    assert not [statement for statement in writes if _is_explainable(statement)]
+
+
+@pytest.mark.anyio
+async def test_sampled_explain_task_is_referenced_until_done(monkeypatch):
+    log = SlowQueryLog(threshold_ms=1, maxlen=10, explain_sample_rate=1)
+    finished = asyncio.Event()
+
+    async def explain(engine, entry, statement, parameters):
+        await finished.wait()
+        log._explaining = False
+
+    monkeypatch.setattr(log, "_explain", explain)
+    log.record(None, "SELECT * FROM products", None, seconds=0.5, executemany=False)
+
+    assert len(log._explain_tasks) == 1
+    finished.set()
+    await asyncio.gather(*log._explain_tasks)
+    await asyncio.sleep(0)
+    assert not log._explain_tasks
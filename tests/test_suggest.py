@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.services.suggest import PrefixIndex
+
+pytestmark = pytest.mark.anyio
+
+
+def _index(products: dict[int, str], categories: dict[int, str] | None = None) -> PrefixIndex:
+    index = PrefixIndex(rebuild_seconds=60)
+    index._swap(PrefixIndex._build({"product": list(products.items()),
+                                    "category": list((categories or {}).items())}))
+    return index
+
+
+def test_whole_name_matches_are_not_cut_by_word_matches():
+    # «phone pro NNN» даёт хвосты «pro NNN», которые по алфавиту идут раньше «prowler»
+    products = {i: f"phone pro {i:03}" for i in range(1, 100)}
+    products[500] = "Prowler"
+    index = _index(products)
+
+    results = index.search("pro", 5)
+
+    assert results[0] == {"type": "product", "id": 500, "name": "Prowler"}
+    assert len(results) == 5
+
+
+def test_changes_during_rebuild_survive_swap():
+    index = _index({1: "Laptop", 2: "Lamp"})
+    index._pending = []
+
+    index.upsert("product", 3, "Lantern")
+    index.remove("product", 2)
+    # Снимок базы сделан до изменений: в нём ещё есть Lamp и нет Lantern
+    index._swap(PrefixIndex._build({"product": [(1, "Laptop"), (2, "Lamp")], "category": []}))
+
+    assert [item["name"] for item in index.search("la", 10)] == ["Laptop", "Lantern"]
+
+
+async def test_stale_index_is_served_while_rebuilding(monkeypatch):
+    index = _index({1: "Laptop"})
+    index._built_at -= 120
+    release = asyncio.Event()
+
+    async def slow_load(db_session):
+        await release.wait()
+        return PrefixIndex._build({"product": [(1, "Laptop"), (2, "Lamp")], "category": []})
+
+    monkeypatch.setattr(index, "_load", slow_load)
+    monkeypatch.setattr("app.services.suggest.async_session_maker", lambda: _NullSession())
+
+    await asyncio.wait_for(index.ensure_loaded(None), timeout=1)
+    assert [item["id"] for item in index.search("la", 10)] == [1]
+
+    release.set()
+    await index._rebuild_task
+    assert [item["id"] for item in index.search("la", 10)] == [2, 1]
+
+
+class _NullSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False